@@ -0,0 +1,43 @@
+'''
+Условные GET-запросы: строгие ETag по содержимому ответа и ответ 304 Not Modified
+'''
+import hashlib
+from typing import Any, Dict, Optional
+
+CATALOG_CACHE_CONTROL = 'public, max-age=300, stale-while-revalidate=86400'
+FEED_CACHE_CONTROL = 'public, max-age=10, stale-while-revalidate=60'
+
+
+def make_etag(payload: str) -> str:
+    return '"' + hashlib.sha1(payload.encode('utf-8')).hexdigest() + '"'
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    if_none_match = get_header(event, 'If-None-Match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return any(tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def not_modified(etag: str, cache_control: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'ETag': etag,
+            'Cache-Control': cache_control
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from cache import CachedBody
+from http_cache import FEED_CACHE_CONTROL, etag_matches, make_etag, not_modified
+from runtime import Request, Router, error, respond
+from serializer import dumps
+from sections import SECTIONS, Section
+
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+# Разделы, которых нет в кэше, читаются параллельно, каждый на своём соединении из пула
+executor = ThreadPoolExecutor(max_workers=len(SECTIONS))
+
+
+def load_section(name: str, section: Section, user_id: Optional[int]) -> CachedBody:
+    if section.cache is not None:
+        return section.cache.get_or_load(name, lambda: section.loader(None))
+    body = section.loader(user_id)
+    return CachedBody(body, make_etag(body))
+
+
+def parse_sections(raw: Optional[str], user_id: Optional[int]) -> Optional[List[str]]:
+    if not raw:
+        return [name for name, section in SECTIONS.items() if user_id is not None or not section.personal]
+    names = [name.strip() for name in raw.split(',')]
+    if not all(name in SECTIONS for name in names):
+        return None
+    if user_id is None and any(SECTIONS[name].personal for name in names):
+        return None
+    return names
+
+
+router = Router()
+
+
+@router.get()
+def get_bootstrap(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('user_id')
+
+    if user_id and not user_id.isdigit():
+        return error(400, 'user_id must be an integer')
+
+    user_id = int(user_id) if user_id else None
+    names = parse_sections(request.params.get('sections'), user_id)
+
+    if names is None:
+        return error(400, f'sections must be a subset of {", ".join(SECTIONS)}; user and achievements require user_id')
+
+    known = {tag.strip().strip('"') for tag in request.params.get('known', '').split(',') if tag.strip()}
+    futures = [executor.submit(load_section, name, SECTIONS[name], user_id) for name in names]
+
+    # Тела разделов уже сериализованы, ответ собирается из готовых фрагментов без повторной сериализации
+    fragments = []
+    for name, future in zip(names, futures):
+        cached = future.result()
+        if cached.etag.strip('"') in known:
+            fragments.append(f'"{name}":{{"etag":{dumps(cached.etag)},"unchanged":true}}')
+        else:
+            fragments.append(f'"{name}":{{"etag":{dumps(cached.etag)},"data":{cached.body}}}')
+
+    body = '{"sections":{' + ','.join(fragments) + '}}'
+    etag = make_etag(body)
+    cache_control = PRIVATE_CACHE_CONTROL if any(SECTIONS[name].personal for name in names) else FEED_CACHE_CONTROL
+
+    if etag_matches(request.event, etag):
+        return not_modified(etag, cache_control)
+
+    return respond(200, headers={'ETag': etag, 'Cache-Control': cache_control}, body=body)
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Стартовые данные главной страницы одним запросом вместо пяти
+    GET /?user_id=1 - уроки, упражнения, лента галереи, пользователь и его достижения
+    GET /?sections=lessons,gallery - только указанные разделы
+    GET /?known=<etag>,<etag> - разделы с совпавшим ETag возвращаются без данных ("unchanged": true)
+    '''
+    return router.dispatch(event)
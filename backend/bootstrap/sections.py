@@ -0,0 +1,88 @@
+'''
+Разделы стартовой страницы. Каждый раздел загружается отдельной функцией со своим
+соединением из пула и сериализуется в JSON независимо от остальных, поэтому разделы
+кэшируются и сверяются по ETag по отдельности.
+'''
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from cache import CATALOG_CACHE_TTL, CatalogCache
+from rows import FEED_ROW, USER_ACHIEVEMENTS_SQL, USER_ROW, USER_SQL, achievements_body, feed_sql
+from runtime import RowMapper, connection
+from serializer import dumps
+
+FEED_CACHE_TTL = float(os.environ.get('FEED_CACHE_TTL', '10'))
+FEED_PAGE_SIZE = 50
+
+LESSON_COLUMNS = ('id', 'title', 'description', 'duration', 'difficulty', 'icon', 'order_index')
+EXERCISE_COLUMNS = ('id', 'title', 'description', 'time_minutes', 'points', 'icon', 'difficulty')
+
+catalog_cache = CatalogCache(CATALOG_CACHE_TTL)
+feed_cache = CatalogCache(FEED_CACHE_TTL)
+
+
+def fetch_all(query: str, params: Any = None) -> List[tuple]:
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
+
+
+LESSON_ROW = RowMapper(LESSON_COLUMNS)
+EXERCISE_ROW = RowMapper(EXERCISE_COLUMNS)
+FEED_SQL = feed_sql("WHERE g.status = 'ready'")
+
+
+def load_lessons(user_id: Optional[int]) -> str:
+    rows = fetch_all(f'''
+        SELECT {', '.join(LESSON_COLUMNS)}
+        FROM lessons
+        ORDER BY order_index
+    ''')
+    return dumps(LESSON_ROW.many(rows))
+
+
+def load_exercises(user_id: Optional[int]) -> str:
+    rows = fetch_all(f'''
+        SELECT {', '.join(EXERCISE_COLUMNS)}
+        FROM exercises
+        ORDER BY points
+    ''')
+    return dumps(EXERCISE_ROW.many(rows))
+
+
+def load_gallery(user_id: Optional[int]) -> str:
+    rows = fetch_all(FEED_SQL, (FEED_PAGE_SIZE,))
+    return dumps(FEED_ROW.many(rows))
+
+
+def load_user(user_id: Optional[int]) -> str:
+    rows = fetch_all(USER_SQL, (user_id,))
+    if not rows:
+        return 'null'
+    return dumps(USER_ROW(rows[0]))
+
+
+def load_achievements(user_id: Optional[int]) -> str:
+    rows = fetch_all(USER_ACHIEVEMENTS_SQL, (user_id,))
+    return achievements_body(rows)
+
+
+class Section:
+    '''
+    cache — общий для всех пользователей кэш раздела; None для личных разделов,
+    которые меняются после каждого завершения и всегда читаются из БД
+    '''
+
+    def __init__(self, loader: Callable[[Optional[int]], str], cache: Optional[CatalogCache], personal: bool):
+        self.loader = loader
+        self.cache = cache
+        self.personal = personal
+
+
+SECTIONS: Dict[str, Section] = {
+    'lessons': Section(load_lessons, catalog_cache, personal=False),
+    'exercises': Section(load_exercises, catalog_cache, personal=False),
+    'gallery': Section(load_gallery, feed_cache, personal=False),
+    'user': Section(load_user, None, personal=True),
+    'achievements': Section(load_achievements, None, personal=True),
+}
@@ -0,0 +1,89 @@
+'''
+Сериализация ответов в JSON. При установленном orjson используется он, иначе стандартный json;
+JSON_BACKEND=json принудительно включает стандартный модуль, вывод которого байт в байт
+совпадает с прежними ответами. Даты и время кодируются без предварительного isoformat().
+'''
+import json
+import os
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson' if orjson is not None else 'json')
+FRAGMENT_CACHE_SIZE = 4096
+
+
+def encode_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if JSON_BACKEND == 'orjson' and orjson is not None:
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value, default=encode_default).decode('utf-8')
+
+    loads = orjson.loads
+    ITEM_SEPARATOR = ','
+else:
+    def dumps(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False, default=encode_default)
+
+    loads = json.loads
+    ITEM_SEPARATOR = ', '
+
+
+def join_array(fragments: Iterable[str]) -> str:
+    return '[' + ITEM_SEPARATOR.join(fragments) + ']'
+
+
+def extend_object(fragment: str, extra: Dict[str, Any]) -> str:
+    '''
+    Добавляет поля extra к уже закодированному объекту fragment
+    '''
+    if not extra:
+        return fragment
+    tail = dumps(extra)[1:]
+    return fragment[:-1] + (ITEM_SEPARATOR + tail if fragment != '{}' else tail)
+
+
+class FragmentCache:
+    '''
+    Закодированный JSON неизменяемых строк (каталог, определения достижений).
+    Ключ — сама строка результата запроса, поэтому изменённая строка получает новую запись;
+    при переполнении кэш очищается целиком.
+    '''
+
+    def __init__(self, encode: Callable[[Any], Any], max_size: int = FRAGMENT_CACHE_SIZE):
+        self.encode = encode
+        self.max_size = max_size
+        self._fragments: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, row: Hashable) -> str:
+        fragment = self._fragments.get(row)
+        if fragment is None:
+            fragment = dumps(self.encode(row))
+            with self._lock:
+                if len(self._fragments) >= self.max_size:
+                    self._fragments.clear()
+                self._fragments[row] = fragment
+        return fragment
+
+    def many(self, rows: Iterable[Hashable]) -> str:
+        return join_array(self.get(row) for row in rows)
+
+    def invalidate(self, row: Optional[Hashable] = None) -> None:
+        with self._lock:
+            if row is None:
+                self._fragments.clear()
+            else:
+                self._fragments.pop(row, None)
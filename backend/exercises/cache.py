@@ -0,0 +1,63 @@
+'''
+Кэш каталога в памяти тёплого контейнера.
+Хранит уже сериализованные JSON-ответы и построенные по каталогу индексы,
+чтобы повторный запрос не ходил в БД и не вызывал json.dumps.
+Каталог меняется только миграциями, а у каждого контейнера свой кэш, поэтому сброса
+по событию нет: правка каталога видна всем контейнерам не позже чем через CATALOG_CACHE_TTL.
+'''
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from http_cache import make_etag
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '300'))
+
+
+class CachedBody(NamedTuple):
+    body: str
+    etag: str
+
+
+class CatalogCache:
+    '''
+    Записи живут ttl секунд, после чего считаются промахом
+    '''
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            return None
+        return value
+
+    def set(self, key: str, value: Any) -> Any:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def get_or_build(self, key: str, builder: Callable[[], Optional[Any]]) -> Optional[Any]:
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = builder()
+        if value is None:
+            return None
+        return self.set(key, value)
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[str]]) -> Optional[CachedBody]:
+        def build() -> Optional[CachedBody]:
+            body = loader()
+            if body is None:
+                return None
+            return CachedBody(body, make_etag(body))
+        
+        return self.get_or_build(key, build)
@@ -1,159 +1,224 @@
-import json
-import os
-import psycopg2
-from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    API для работы с упражнениями
-    GET / - получить все упражнения
-    POST /complete - завершить упражнение с подсчетом XP
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cur = conn.cursor()
-    
-    if method == 'GET':
+from achievements import AWARD_CTES, get_engine
+from cache import CATALOG_CACHE_TTL, CachedBody, CatalogCache
+from http_cache import CATALOG_CACHE_CONTROL, etag_matches, make_etag, not_modified
+from recommendations import REFRESH_RECOMMENDATIONS_CTE
+from runtime import Request, Router, RowMapper, connection, error, respond
+from search import MAX_QUERY_LENGTH, SEARCH_CACHE_CONTROL, parse_search, search_page, search_sql
+from serializer import dumps, join_array
+from streaks import STREAK_CTES, streak_params
+
+MAX_BATCH_IDS = 100
+
+catalog_cache = CatalogCache(CATALOG_CACHE_TTL)
+
+# Завершение упражнения за один запрос к БД: запись выполнения, начисление XP,
+# счётчики user_stats, недельный XP для таблицы лидеров и серия дней user_streaks.
+# Все CTE видят один снимок данных, поэтому проверка "упражнение выполнено впервые" (first_completion) не видит
+# только что вставленную строку; по ней же пересчитываются рекомендации — после повтора упражнения их обновит TTL.
+# Достижения выдаются в том же запросе (AWARD_CTES) по всем достигнутым порогам, уже выданные отсекает ON CONFLICT.
+COMPLETE_EXERCISE_SQL = '''
+    WITH ''' + STREAK_CTES + ''', exercise AS (
+        SELECT id, points FROM exercises WHERE id = %(exercise_id)s
+    ), first_completion AS (
+        SELECT NOT EXISTS (
+            SELECT 1 FROM user_exercises
+            WHERE user_id = %(user_id)s AND exercise_id = %(exercise_id)s
+        ) AS is_first
+    ), completion AS (
+        INSERT INTO user_exercises (user_id, exercise_id, time_spent, score, completed_at)
+        SELECT %(user_id)s, id, %(time_spent)s, %(score)s, CURRENT_TIMESTAMP AT TIME ZONE 'UTC' FROM exercise
+        RETURNING id
+    ), xp AS (
+        UPDATE users
+        SET total_xp = total_xp + (SELECT points FROM exercise)
+        WHERE id = %(user_id)s AND EXISTS (SELECT 1 FROM completion)
+        RETURNING total_xp
+    ), stats AS (
+        INSERT INTO user_stats (user_id, completed_exercises, exercise_completions)
+        SELECT %(user_id)s, CASE WHEN first_completion.is_first THEN 1 ELSE 0 END, 1
+        FROM completion, first_completion
+        ON CONFLICT (user_id) DO UPDATE
+        SET completed_exercises = user_stats.completed_exercises + EXCLUDED.completed_exercises,
+            exercise_completions = user_stats.exercise_completions + 1,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING exercise_completions
+    ), weekly AS (
+        INSERT INTO user_xp_weekly (week_start, user_id, xp)
+        SELECT leaderboard_week_start(), %(user_id)s, (SELECT points FROM exercise)
+        FROM completion
+        ON CONFLICT (week_start, user_id) DO UPDATE
+        SET xp = user_xp_weekly.xp + EXCLUDED.xp
+    ), achievement_values (requirement_type, value) AS (
+        SELECT 'exercises_completed', exercise_completions FROM stats
+        UNION ALL
+        SELECT 'daily_streak', current_streak FROM streak
+    ), ''' + AWARD_CTES + ''', ''' + REFRESH_RECOMMENDATIONS_CTE + '''
+    SELECT
+        (SELECT id FROM completion),
+        (SELECT points FROM exercise),
+        (SELECT total_xp FROM xp),
+        (SELECT current_streak FROM streak),
+        ARRAY(SELECT achievement_id FROM awarded),
+        (SELECT count(*) FROM recommendations)
+'''
+
+
+EXERCISE_ROW = RowMapper(('id', 'title', 'description', 'time_minutes', 'points', 'icon', 'difficulty'))
+
+SEARCH_SQL = search_sql(
+    'exercises',
+    ', '.join(f't.{column}' for column in EXERCISE_ROW.columns),
+    "concat_ws(' ', t.title, t.description)",
+    't.points, t.id'
+)
+
+
+def load_exercise_index() -> Dict[int, Dict[str, Any]]:
+    with connection() as conn, conn.cursor() as cur:
         cur.execute('''
             SELECT id, title, description, time_minutes, points, icon, difficulty
             FROM exercises
             ORDER BY points
         ''')
         rows = cur.fetchall()
-        
-        exercises = []
-        for row in rows:
-            exercises.append({
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'time_minutes': row[3],
-                'points': row[4],
-                'icon': row[5],
-                'difficulty': row[6]
-            })
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(exercises, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
     
-    if method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        user_id = body_data.get('user_id')
-        exercise_id = body_data.get('exercise_id')
-        time_spent = body_data.get('time_spent')
-        score = body_data.get('score', 100)
-        
-        if not user_id or not exercise_id:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'user_id and exercise_id required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute('SELECT points FROM exercises WHERE id = %s', (exercise_id,))
-        exercise_row = cur.fetchone()
-        
-        if not exercise_row:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Exercise not found'}),
-                'isBase64Encoded': False
-            }
-        
-        points = exercise_row[0]
-        
-        cur.execute('''
-            INSERT INTO user_exercises (user_id, exercise_id, time_spent, score)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id
-        ''', (user_id, exercise_id, time_spent, score))
-        
-        exercise_completion_id = cur.fetchone()[0]
-        
-        cur.execute('''
-            UPDATE users
-            SET total_xp = total_xp + %s
-            WHERE id = %s
-            RETURNING total_xp
-        ''', (points, user_id))
-        
-        new_xp = cur.fetchone()[0]
-        
-        cur.execute('''
-            SELECT COUNT(*) FROM user_exercises WHERE user_id = %s
-        ''', (user_id,))
-        total_exercises = cur.fetchone()[0]
+    return {row[0]: EXERCISE_ROW(row) for row in rows}
+
+
+def get_exercise_index() -> Dict[int, Dict[str, Any]]:
+    '''
+    Индекс id -> упражнение в порядке каталога, строится один раз на тёплый контейнер
+    '''
+    return catalog_cache.get_or_build('exercises:index', load_exercise_index)
+
+
+def get_exercise_body(exercise_id: int) -> Optional[CachedBody]:
+    def load() -> Optional[str]:
+        exercise = get_exercise_index().get(exercise_id)
+        if exercise is None:
+            return None
+        return dumps(exercise)
+    
+    return catalog_cache.get_or_load(f'exercise:{exercise_id}', load)
+
+
+def get_exercises_body() -> CachedBody:
+    return catalog_cache.get_or_load(
+        'exercises',
+        lambda: join_array(get_exercise_body(exercise_id).body for exercise_id in get_exercise_index())
+    )
+
+
+def parse_ids(raw: str) -> Optional[List[int]]:
+    ids = []
+    for part in raw.split(','):
+        part = part.strip()
+        if not part.isdigit():
+            return None
+        exercise_id = int(part)
+        if exercise_id not in ids:
+            ids.append(exercise_id)
+    return ids
+
+
+router = Router(allow_headers='Content-Type, X-User-Id')
+
+
+@router.get('search')
+def search_exercises(request: Request) -> Dict[str, Any]:
+    query = parse_search(request.params)
+    
+    if query is None:
+        return error(400, f'q (up to {MAX_QUERY_LENGTH} characters), limit and offset required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(SEARCH_SQL, {'q': query.text, 'limit': query.limit, 'offset': query.offset})
+        rows = cur.fetchall()
+    
+    body = dumps(search_page(query, EXERCISE_ROW, rows))
+    etag = make_etag(body)
+    if etag_matches(request.event, etag):
+        return not_modified(etag, SEARCH_CACHE_CONTROL)
+    
+    return respond(200, headers={'ETag': etag, 'Cache-Control': SEARCH_CACHE_CONTROL}, body=body)
+
+
+@router.get()
+def get_exercises(request: Request) -> Dict[str, Any]:
+    exercise_id = request.params.get('id')
+    exercise_ids = request.params.get('ids')
+    
+    if exercise_id:
+        if not exercise_id.isdigit():
+            return error(400, 'id must be an integer')
         
-        cur.execute('''
-            SELECT a.id, a.name
-            FROM achievements a
-            WHERE a.requirement_type = 'exercises_completed' 
-            AND a.requirement_value <= %s
-            AND NOT EXISTS (
-                SELECT 1 FROM user_achievements ua 
-                WHERE ua.user_id = %s AND ua.achievement_id = a.id
-            )
-        ''', (total_exercises, user_id))
+        cached = get_exercise_body(int(exercise_id))
         
-        new_achievements = []
-        for row in cur.fetchall():
-            cur.execute('''
-                INSERT INTO user_achievements (user_id, achievement_id)
-                VALUES (%s, %s)
-            ''', (user_id, row[0]))
-            new_achievements.append({'id': row[0], 'name': row[1]})
+        if cached is None:
+            return error(404, 'Exercise not found')
+    elif exercise_ids:
+        ids = parse_ids(exercise_ids)
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        if ids is None or len(ids) > MAX_BATCH_IDS:
+            return error(400, f'ids must be up to {MAX_BATCH_IDS} comma-separated integers')
         
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({
-                'id': exercise_completion_id,
-                'xp_earned': points,
-                'total_xp': new_xp,
-                'new_achievements': new_achievements
-            }, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
+        found = [get_exercise_body(i) for i in ids]
+        body = join_array(item.body for item in found if item is not None)
+        cached = CachedBody(body, make_etag(body))
+    else:
+        cached = get_exercises_body()
+    
+    if etag_matches(request.event, cached.etag):
+        return not_modified(cached.etag, CATALOG_CACHE_CONTROL)
+    
+    return respond(200, headers={'ETag': cached.etag, 'Cache-Control': CATALOG_CACHE_CONTROL}, body=cached.body)
+
+
+@router.post()
+def complete_exercise(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('user_id')
+    exercise_id = request.body.get('exercise_id')
+    
+    if not user_id or not exercise_id:
+        return error(400, 'user_id and exercise_id required')
     
-    cur.close()
-    conn.close()
+    with connection() as conn, conn.cursor() as cur:
+        engine = get_engine(cur)
+        cur.execute(COMPLETE_EXERCISE_SQL, {
+            'exercise_id': exercise_id,
+            'time_spent': request.body.get('time_spent'),
+            'score': request.body.get('score', 100),
+            'completed_lesson_id': None,
+            'completed_exercise_id': exercise_id,
+            **engine.rule_params('exercises_completed', 'daily_streak'),
+            **streak_params(user_id, request.body.get('timezone'))
+        })
+        exercise_completion_id, points, new_xp, streak, awarded, _ = cur.fetchone()
+        
+        if exercise_completion_id is None:
+            return error(404, 'Exercise not found')
+        
+        new_achievements = engine.describe(awarded)
+        conn.commit()
     
-    return {
-        'statusCode': 405,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
+    return respond(200, {
+        'id': exercise_completion_id,
+        'xp_earned': points,
+        'total_xp': new_xp,
+        'streak': streak,
+        'new_achievements': new_achievements
+    })
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для работы с упражнениями
+    GET / - получить все упражнения
+    GET /?id=1 - получить упражнение по ID
+    GET /?ids=1,2,3 - получить несколько упражнений по ID
+    GET /?action=search&q=штриховка&limit=20&offset=0 - поиск по названию и описанию упражнений
+    POST /complete - завершить упражнение с подсчетом XP
+    '''
+    return router.dispatch(event)
@@ -1,134 +1,271 @@
-import json
-import os
 import base64
-import psycopg2
-import boto3
+import os
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
-s3 = boto3.client('s3',
-    endpoint_url='https://bucket.poehali.dev',
-    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+import psycopg2
+
+from http_cache import FEED_CACHE_CONTROL, etag_matches, make_etag, not_modified
+from reactions import add_comment, flush_counters, like, list_comments, unlike
+from renditions import process_pending
+from rows import FEED_ROW, cdn_url, feed_sql
+from runtime import Request, Router, connection, error, respond
+from upload_jobs import enqueue_upload, process_uploads, upload_status
+from uploads import (
+    BUCKET, CONTENT_TYPES, MAX_UPLOAD_SIZE, complete_upload,
+    create_upload, get_s3, is_base64, is_user_key, make_key, object_exists, valid_parts,
 )
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    API для работы с галереей работ
-    GET / - получить все работы
-    POST / - загрузить новую работу (base64)
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cur = conn.cursor()
-    
-    if method == 'GET':
-        cur.execute('''
-            SELECT g.id, g.user_id, u.username, u.level, g.title, g.description, 
-                   g.image_url, g.likes_count, g.comments_count, g.created_at
-            FROM gallery g
-            JOIN users u ON g.user_id = u.id
-            ORDER BY g.created_at DESC
-            LIMIT 50
-        ''')
+FEED_PAGE_SIZE = 50
+FEED_MAX_PAGE_SIZE = 100
+# Работы из base64 принимаются сразу (202, status pending), а в S3 их записывает process-uploads
+ASYNC_UPLOADS = os.environ.get('ASYNC_UPLOADS', '1') == '1'
+
+
+def encode_cursor(created_at: datetime, gallery_id: int) -> str:
+    raw = f'{created_at.isoformat()}|{gallery_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, gallery_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(gallery_id)
+    except ValueError:
+        return None
+
+
+router = Router(allow_headers='Content-Type, X-User-Id')
+
+
+@router.get('comments')
+def get_comments(request: Request) -> Dict[str, Any]:
+    gallery_id = request.params.get('gallery_id', '')
+    
+    if not gallery_id.isdigit():
+        return error(400, 'gallery_id required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        comments = list_comments(cur, int(gallery_id))
+    
+    return respond(200, comments)
+
+
+@router.get()
+def get_feed(request: Request) -> Dict[str, Any]:
+    cursor = request.params.get('cursor')
+    author_id = request.params.get('user_id')
+    limit = request.params.get('limit', str(FEED_PAGE_SIZE))
+    
+    after = decode_cursor(cursor) if cursor else None
+    
+    if (cursor and after is None) or (author_id and not author_id.isdigit()) or not limit.isdigit():
+        return error(400, 'invalid cursor, user_id or limit')
+    
+    limit = max(1, min(int(limit), FEED_MAX_PAGE_SIZE))
+    conditions = ["g.status = 'ready'"]
+    query_params: List[Any] = []
+    
+    if author_id:
+        conditions.append('g.user_id = %s')
+        query_params.append(int(author_id))
+    if after:
+        conditions.append('(g.created_at, g.id) < (%s, %s)')
+        query_params.extend(after)
+    
+    where = f"WHERE {' AND '.join(conditions)}"
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(feed_sql(where), (*query_params, limit + 1))
         rows = cur.fetchall()
+    
+    next_cursor = encode_cursor(rows[limit - 1][9], rows[limit - 1][0]) if len(rows) > limit else ''
+    rows = rows[:limit]
+    
+    etag = make_etag(repr(rows) + next_cursor)
+    if etag_matches(request.event, etag):
+        return not_modified(etag, FEED_CACHE_CONTROL)
+    
+    return respond(200, FEED_ROW.many(rows), headers={
+        'Access-Control-Expose-Headers': 'ETag, X-Next-Cursor',
+        'ETag': etag,
+        'Cache-Control': FEED_CACHE_CONTROL,
+        'X-Next-Cursor': next_cursor
+    })
+
+
+@router.post('upload-url')
+def get_upload_url(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('user_id')
+    content_type = request.body.get('content_type', 'image/png')
+    size = request.body.get('size')
+    
+    if not str(user_id).isdigit() or content_type not in CONTENT_TYPES or not isinstance(size, int) or not 0 < size <= MAX_UPLOAD_SIZE:
+        return error(400, f'user_id, size up to {MAX_UPLOAD_SIZE} bytes and content_type ({", ".join(CONTENT_TYPES)}) required')
+    
+    return respond(200, create_upload(int(user_id), content_type, size))
+
+
+def react(request: Request, action: str) -> Dict[str, Any]:
+    user_id = request.body.get('user_id')
+    gallery_id = request.body.get('gallery_id')
+    comment = (request.body.get('comment') or '').strip()
+    
+    if not str(user_id).isdigit() or not str(gallery_id).isdigit() or (action == 'comment' and not comment):
+        return error(400, 'user_id and gallery_id (and comment) required')
+    
+    user_id, gallery_id = int(user_id), int(gallery_id)
+    with connection() as conn, conn.cursor() as cur:
+        try:
+            if action == 'like':
+                changed = like(cur, user_id, gallery_id)
+                result = None if changed is None else {'liked': True, 'changed': changed}
+            elif action == 'unlike':
+                changed = unlike(cur, user_id, gallery_id)
+                result = None if changed is None else {'liked': False, 'changed': changed}
+            else:
+                result = add_comment(cur, user_id, gallery_id, comment)
+            conn.commit()
+        except psycopg2.IntegrityError:
+            # Работу или пользователя удалили между проверкой и записью
+            result = None
+    
+    if result is None:
+        return error(404, 'Artwork or user not found')
+    
+    return respond(201 if action == 'comment' else 200, result)
+
+
+@router.post('like')
+def like_artwork(request: Request) -> Dict[str, Any]:
+    return react(request, 'like')
+
+
+@router.post('unlike')
+def unlike_artwork(request: Request) -> Dict[str, Any]:
+    return react(request, 'unlike')
+
+
+@router.post('comment')
+def comment_artwork(request: Request) -> Dict[str, Any]:
+    return react(request, 'comment')
+
+
+@router.post('flush-counters', worker=True)
+def flush_counters_route(request: Request) -> Dict[str, Any]:
+    with connection() as conn:
+        updated = flush_counters(conn)
+    return respond(200, {'updated': updated})
+
+
+@router.post('process-renditions', worker=True)
+def process_renditions_route(request: Request) -> Dict[str, Any]:
+    with connection() as conn:
+        processed = process_pending(conn)
+    return respond(200, {'processed': processed})
+
+
+@router.post('process-uploads', worker=True)
+def process_uploads_route(request: Request) -> Dict[str, Any]:
+    with connection() as conn:
+        result = process_uploads(conn)
+    return respond(200, result)
+
+
+@router.get('upload-status')
+def get_upload_status(request: Request) -> Dict[str, Any]:
+    gallery_id = request.params.get('id', '')
+    
+    if not gallery_id.isdigit():
+        return error(400, 'id required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        status = upload_status(cur, int(gallery_id))
+    
+    if status is None:
+        return error(404, 'Artwork not found')
+    return respond(200, status, headers={'Cache-Control': 'no-store'})
+
+
+@router.post('complete-upload')
+def complete_upload_route(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('user_id')
+    key = request.body.get('key')
+    upload_id = request.body.get('upload_id')
+    parts = request.body.get('parts')
+    
+    if (not str(user_id).isdigit() or not isinstance(key, str) or not isinstance(upload_id, str) or not upload_id
+            or not valid_parts(parts) or not is_user_key(key, int(user_id))):
+        return error(400, 'user_id, key, upload_id and parts (part_number, etag) required')
+    
+    if not complete_upload(key, upload_id, parts):
+        return error(400, 'Upload could not be completed')
+    return respond(200, {'key': key})
+
+
+@router.post()
+def create_artwork(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('user_id')
+    title = request.body.get('title', 'Без названия')
+    description = request.body.get('description', '')
+    key = request.body.get('key')
+    image_base64 = request.body.get('image')
+    
+    if not str(user_id).isdigit() or not (key or image_base64):
+        return error(400, 'user_id and key (or image) required')
+    
+    if key:
+        if not isinstance(key, str) or not is_user_key(key, int(user_id)) or not object_exists(key):
+            return error(400, 'Uploaded image not found')
+    else:
+        if not is_base64(image_base64):
+            return error(400, f'image must be base64 of at most {MAX_UPLOAD_SIZE} bytes')
         
-        gallery = []
-        for row in rows:
-            gallery.append({
-                'id': row[0],
-                'user_id': row[1],
-                'author': row[2],
-                'level': row[3],
-                'title': row[4],
-                'description': row[5],
-                'image_url': row[6],
-                'likes': row[7],
-                'comments': row[8],
-                'created_at': row[9].isoformat() if row[9] else None
-            })
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(gallery, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
-    
-    if method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        user_id = body_data.get('user_id')
-        title = body_data.get('title', 'Без названия')
-        description = body_data.get('description', '')
-        image_base64 = body_data.get('image')
-        
-        if not user_id or not image_base64:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'user_id and image required'}),
-                'isBase64Encoded': False
-            }
-        
-        image_data = base64.b64decode(image_base64)
+        key = make_key(int(user_id), 'png')
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'gallery/{user_id}_{timestamp}.png'
+        if ASYNC_UPLOADS:
+            with connection() as conn, conn.cursor() as cur:
+                gallery_id = enqueue_upload(
+                    cur, user_id, title, description, key, cdn_url(key), 'image/png', image_base64
+                )
+                conn.commit()
+            return respond(202, {'id': gallery_id, 'status': 'pending'})
         
-        s3.put_object(
-            Bucket='files',
-            Key=filename,
-            Body=image_data,
+        get_s3().put_object(
+            Bucket=BUCKET,
+            Key=key,
+            Body=base64.b64decode(image_base64),
             ContentType='image/png'
         )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{filename}"
-        
+    
+    image_url = cdn_url(key)
+    
+    with connection() as conn, conn.cursor() as cur:
         cur.execute('''
             INSERT INTO gallery (user_id, title, description, image_url)
             VALUES (%s, %s, %s, %s)
             RETURNING id
-        ''', (user_id, title, description, cdn_url))
-        
+        ''', (user_id, title, description, image_url))
         gallery_id = cur.fetchone()[0]
         conn.commit()
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 201,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'id': gallery_id, 'image_url': cdn_url}),
-            'isBase64Encoded': False
-        }
-    
-    cur.close()
-    conn.close()
-    
-    return {
-        'statusCode': 405,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
+    
+    return respond(201, {'id': gallery_id, 'image_url': image_url})
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для работы с галереей работ
+    GET / - получить последние работы (следующая страница: ?cursor= из заголовка X-Next-Cursor)
+    GET /?user_id=1 - получить работы одного автора
+    GET /?action=comments&gallery_id=1 - получить последние комментарии к работе
+    POST /?action=like, ?action=unlike - поставить или снять лайк (повтор ничего не меняет)
+    POST /?action=comment - добавить комментарий
+    POST /?action=flush-counters - свернуть накопленные лайки и комментарии в счётчики (по расписанию, X-Worker-Token)
+    POST /?action=upload-url - получить подписанную ссылку (или ссылки на части) для загрузки в S3
+    POST /?action=complete-upload - собрать multipart upload из загруженных частей
+    POST /?action=process-renditions - построить уменьшенные копии для новых работ (по расписанию, X-Worker-Token)
+    POST /?action=process-uploads - записать в S3 работы, принятые из base64 (по расписанию, X-Worker-Token)
+    GET /?action=upload-status&id=1 - статус работы: pending, ready или failed
+    POST / - добавить работу по ключу загруженного файла (key) или из base64 (image, ответ 202 до записи в S3)
+    '''
+    return router.dispatch(event)
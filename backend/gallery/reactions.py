@@ -0,0 +1,157 @@
+'''
+Лайки и комментарии к работам галереи.
+Запись не трогает строку gallery: изменение счётчика добавляется в gallery_counter_deltas,
+а flush_counters периодически сворачивает накопленные изменения в likes_count/comments_count
+одним UPDATE на работу, поэтому популярная работа не становится точкой блокировок.
+'''
+from typing import Any, Dict, List, Optional
+
+from achievements import get_engine
+
+COMMENTS_PAGE_SIZE = 50
+FLUSH_BATCH_SIZE = 10000
+
+
+# Работа и пользователь существуют; запись реакции без них нарушила бы внешние ключи
+FOUND_SQL = '''
+    EXISTS (SELECT 1 FROM gallery WHERE id = %(gallery_id)s) AND EXISTS (SELECT 1 FROM users WHERE id = %(user_id)s)
+'''
+
+
+def like(cur: Any, user_id: int, gallery_id: int) -> Optional[bool]:
+    '''
+    True — лайк поставлен, False — уже был, None — нет работы или пользователя
+    '''
+    cur.execute('''
+        WITH liked AS (
+            INSERT INTO gallery_likes (gallery_id, user_id)
+            SELECT g.id, u.id FROM gallery g, users u
+            WHERE g.id = %(gallery_id)s AND u.id = %(user_id)s
+            ON CONFLICT (gallery_id, user_id) DO NOTHING
+            RETURNING gallery_id
+        ), delta AS (
+            INSERT INTO gallery_counter_deltas (gallery_id, likes_delta)
+            SELECT gallery_id, 1 FROM liked
+        )
+        SELECT ''' + FOUND_SQL + ''', EXISTS (SELECT 1 FROM liked)
+    ''', {'user_id': user_id, 'gallery_id': gallery_id})
+    found, changed = cur.fetchone()
+    return changed if found else None
+
+
+def unlike(cur: Any, user_id: int, gallery_id: int) -> Optional[bool]:
+    '''
+    True — лайк снят, False — его не было, None — нет работы или пользователя
+    '''
+    cur.execute('''
+        WITH unliked AS (
+            DELETE FROM gallery_likes
+            WHERE gallery_id = %(gallery_id)s AND user_id = %(user_id)s
+            RETURNING gallery_id
+        ), delta AS (
+            INSERT INTO gallery_counter_deltas (gallery_id, likes_delta)
+            SELECT gallery_id, -1 FROM unliked
+        )
+        SELECT ''' + FOUND_SQL + ''', EXISTS (SELECT 1 FROM unliked)
+    ''', {'user_id': user_id, 'gallery_id': gallery_id})
+    found, changed = cur.fetchone()
+    return changed if found else None
+
+
+def add_comment(cur: Any, user_id: int, gallery_id: int, comment: str) -> Optional[Dict[str, Any]]:
+    cur.execute('''
+        WITH comment AS (
+            INSERT INTO gallery_comments (gallery_id, user_id, comment)
+            SELECT g.id, u.id, %(comment)s FROM gallery g, users u
+            WHERE g.id = %(gallery_id)s AND u.id = %(user_id)s
+            RETURNING id, created_at
+        ), delta AS (
+            INSERT INTO gallery_counter_deltas (gallery_id, comments_delta)
+            SELECT %(gallery_id)s, 1 FROM comment
+        )
+        SELECT id, created_at FROM comment
+    ''', {'user_id': user_id, 'gallery_id': gallery_id, 'comment': comment})
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {'id': row[0], 'created_at': row[1]}
+
+
+def list_comments(cur: Any, gallery_id: int) -> List[Dict[str, Any]]:
+    cur.execute('''
+        SELECT c.id, c.user_id, u.username, c.comment, c.created_at
+        FROM gallery_comments c
+        JOIN users u ON c.user_id = u.id
+        WHERE c.gallery_id = %s
+        ORDER BY c.created_at DESC, c.id DESC
+        LIMIT %s
+    ''', (gallery_id, COMMENTS_PAGE_SIZE))
+    return [
+        {
+            'id': row[0],
+            'user_id': row[1],
+            'author': row[2],
+            'comment': row[3],
+            'created_at': row[4]
+        }
+        for row in cur.fetchall()
+    ]
+
+
+def flush_counters(conn: Any) -> int:
+    '''
+    Сворачивает до FLUSH_BATCH_SIZE накопленных изменений в счётчики gallery и
+    user_stats.total_likes авторов, затем выдаёт достижения за лайки тем,
+    чей счётчик достиг порога. Возвращает число обновлённых работ.
+    '''
+    cur = conn.cursor()
+    cur.execute('''
+        WITH taken AS (
+            DELETE FROM gallery_counter_deltas
+            WHERE id IN (
+                SELECT id FROM gallery_counter_deltas
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING gallery_id, likes_delta, comments_delta
+        ), per_item AS (
+            SELECT gallery_id, SUM(likes_delta) AS likes, SUM(comments_delta) AS comments
+            FROM taken
+            GROUP BY gallery_id
+        ), items AS (
+            UPDATE gallery g
+            SET likes_count = g.likes_count + per_item.likes,
+                comments_count = g.comments_count + per_item.comments
+            FROM per_item
+            WHERE g.id = per_item.gallery_id
+            RETURNING g.user_id, per_item.likes
+        ), per_author AS (
+            SELECT user_id, SUM(likes)::int AS likes
+            FROM items
+            GROUP BY user_id
+            HAVING SUM(likes) <> 0
+        ), authors AS (
+            INSERT INTO user_stats (user_id, total_likes)
+            SELECT user_id, likes FROM per_author
+            ON CONFLICT (user_id) DO UPDATE
+            SET total_likes = user_stats.total_likes + EXCLUDED.total_likes,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING user_id, total_likes
+        )
+        SELECT (SELECT COUNT(*) FROM items), a.user_id, a.total_likes, p.likes
+        FROM (SELECT 1) one
+        LEFT JOIN authors a ON true
+        LEFT JOIN per_author p ON p.user_id = a.user_id
+    ''', (FLUSH_BATCH_SIZE,))
+    rows = cur.fetchall()
+    items_updated = rows[0][0]
+
+    engine = get_engine(cur)
+    for _, author_id, total_likes, _ in rows:
+        if author_id is not None:
+            engine.award(cur, author_id, engine.reached('total_likes', total_likes))
+
+    conn.commit()
+    cur.close()
+    return items_updated
@@ -0,0 +1,124 @@
+'''
+Уменьшенные WebP-копии работ галереи и крошечная JPEG-заглушка (LQIP).
+Копии строятся вне запроса на загрузку: POST ?action=process-renditions
+(вызывается по расписанию) забирает пачку работ без копий и обрабатывает её в пуле потоков.
+Pillow импортируется только этим действием, чтобы не удлинять холодный старт ленты.
+'''
+import base64
+import io
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from uploads import BUCKET, get_s3
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = (1280, 640, 320)
+RENDITION_QUALITY = 80
+PLACEHOLDER_WIDTH = 16
+RENDITIONS_BATCH_SIZE = 20
+RENDITIONS_CLAIM_TIMEOUT = '10 minutes'
+RENDITIONS_WORKERS = int(os.environ.get('RENDITIONS_WORKERS', '4'))
+
+
+def key_from_url(image_url: str) -> str:
+    return image_url.split('/bucket/', 1)[1]
+
+
+def load_image(key: str) -> 'Image.Image':
+    from PIL import Image, ImageOps
+
+    obj = get_s3().get_object(Bucket=BUCKET, Key=key)
+    image = Image.open(io.BytesIO(obj['Body'].read()))
+    image.draft('RGB', (RENDITION_WIDTHS[0], RENDITION_WIDTHS[0]))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render(key: str) -> Tuple[List[Dict[str, Any]], str]:
+    '''
+    Копии строятся от большей к меньшей, каждая уменьшается из предыдущей
+    '''
+    from PIL import Image
+
+    image = load_image(key)
+    base = key.rsplit('.', 1)[0]
+    renditions = []
+
+    for width in RENDITION_WIDTHS:
+        if width >= image.width and renditions:
+            continue
+        image.thumbnail((width, image.height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=RENDITION_QUALITY)
+        rendition_key = f'{base}_w{image.width}.webp'
+        get_s3().put_object(Bucket=BUCKET, Key=rendition_key, Body=buffer.getvalue(), ContentType='image/webp')
+        renditions.append({'key': rendition_key, 'width': image.width})
+
+    image.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=50)
+    placeholder = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    return renditions, placeholder
+
+
+def safe_render(key: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    try:
+        return render(key)
+    except Exception:
+        logger.exception('rendition failed for %s', key)
+        return [], None
+
+
+def process_pending(conn: Any, limit: int = RENDITIONS_BATCH_SIZE) -> int:
+    '''
+    Забирает до limit работ без копий (SKIP LOCKED, чтобы параллельные вызовы
+    не делили одни и те же строки), строит копии и сохраняет их ключи.
+    Неудачная работа получает пустой список копий и больше не повторяется.
+    '''
+    cur = conn.cursor()
+    cur.execute(f'''
+        UPDATE gallery SET renditions_claimed_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM gallery
+            WHERE renditions IS NULL AND status = 'ready'
+            AND (renditions_claimed_at IS NULL
+                 OR renditions_claimed_at < CURRENT_TIMESTAMP - INTERVAL '{RENDITIONS_CLAIM_TIMEOUT}')
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, image_url
+    ''', (limit,))
+    claimed = cur.fetchall()
+    conn.commit()
+
+    if not claimed:
+        cur.close()
+        return 0
+
+    with ThreadPoolExecutor(max_workers=RENDITIONS_WORKERS) as pool:
+        results = list(pool.map(safe_render, [key_from_url(image_url) for _, image_url in claimed]))
+
+    for (gallery_id, _), (renditions, placeholder) in zip(claimed, results):
+        cur.execute('''
+            UPDATE gallery SET renditions = %s, placeholder = %s
+            WHERE id = %s
+        ''', (json.dumps(renditions), placeholder, gallery_id))
+    conn.commit()
+    cur.close()
+
+    return len(claimed)
@@ -0,0 +1,84 @@
+'''
+Запросы и отображения строк, которые отдают несколько функций: лента галереи (gallery, bootstrap),
+профиль пользователя (users, bootstrap) и достижения пользователя (progress, bootstrap).
+'''
+import os
+from typing import Any, Dict, List, Optional
+
+from runtime import RowMapper
+from serializer import FragmentCache, extend_object, join_array
+
+
+def cdn_url(key: str) -> str:
+    return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
+
+
+def build_srcset(renditions: Optional[List[Dict[str, Any]]]) -> Optional[str]:
+    if not renditions:
+        return None
+    return ', '.join(f"{cdn_url(r['key'])} {r['width']}w" for r in sorted(renditions, key=lambda r: r['width']))
+
+
+FEED_ROW = RowMapper((
+    'id', 'user_id', 'author', 'level', 'title', 'description',
+    'image_url', 'likes', 'comments', 'created_at', 'srcset', 'placeholder'
+), srcset=build_srcset)
+
+
+def feed_sql(where: str) -> str:
+    '''
+    Страница ленты от новых к старым; where — условие WHERE по g (gallery) и u (users), последний параметр — LIMIT
+    '''
+    return f'''
+        SELECT g.id, g.user_id, u.username, u.level, g.title, g.description,
+               g.image_url, g.likes_count, g.comments_count, g.created_at,
+               g.renditions, g.placeholder
+        FROM gallery g
+        JOIN users u ON g.user_id = u.id
+        {where}
+        ORDER BY g.created_at DESC, g.id DESC
+        LIMIT %s
+    '''
+
+
+USER_ROW = RowMapper((
+    'id', 'username', 'email', 'level', 'total_xp', 'avatar_url',
+    'completed_lessons', 'completed_exercises', 'total_likes', 'current_streak', 'best_streak'
+), current_streak=lambda streak: streak or 0)
+
+# Серия считается текущей, только если последний активный день — сегодня или вчера в поясе пользователя
+USER_SQL = '''
+    SELECT u.id, u.username, u.email, u.level, u.total_xp, u.avatar_url,
+           COALESCE(s.completed_lessons, 0),
+           COALESCE(s.completed_exercises, 0),
+           COALESCE(s.total_likes, 0),
+           CASE WHEN st.last_active_date >= (CURRENT_TIMESTAMP AT TIME ZONE st.timezone)::date - 1
+                THEN st.current_streak ELSE 0 END,
+           COALESCE(st.best_streak, 0)
+    FROM users u
+    LEFT JOIN user_stats s ON s.user_id = u.id
+    LEFT JOIN user_streaks st ON st.user_id = u.id
+    WHERE u.id = %s
+'''
+
+# Определения достижений не меняются между запросами: кодируются один раз,
+# к готовому фрагменту дописываются только поля конкретного пользователя
+ACHIEVEMENT_FRAGMENTS = FragmentCache(RowMapper(('id', 'name', 'description', 'icon', 'requirement_type', 'requirement_value')))
+
+USER_ACHIEVEMENTS_SQL = '''
+    SELECT a.id, a.name, a.description, a.icon, a.requirement_type, a.requirement_value,
+           ua.id IS NOT NULL, ua.unlocked_at
+    FROM achievements a
+    LEFT JOIN user_achievements ua ON a.id = ua.achievement_id AND ua.user_id = %s
+    ORDER BY a.id
+'''
+
+
+def achievements_body(rows: List[tuple]) -> str:
+    '''
+    JSON-массив строк USER_ACHIEVEMENTS_SQL с полями unlocked и unlocked_at
+    '''
+    return join_array(
+        extend_object(ACHIEVEMENT_FRAGMENTS.get(row[:6]), {'unlocked': row[6], 'unlocked_at': row[7]})
+        for row in rows
+    )
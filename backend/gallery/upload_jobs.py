@@ -0,0 +1,165 @@
+'''
+Асинхронная загрузка изображений, присланных в base64 (POST / с полем image).
+Запрос только записывает работу со статусом pending и задание в gallery_upload_jobs
+одним INSERT и сразу отвечает 202: декодирование и запись в S3 выполняет
+POST ?action=process-uploads (по расписанию), забирая пачку заданий через SKIP LOCKED
+и отправляя файлы в S3 параллельно в пуле потоков. Клиент опрашивает GET ?action=upload-status.
+'''
+import base64
+import binascii
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from uploads import BUCKET, get_s3
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_JOBS_BATCH_SIZE = 20
+UPLOAD_JOBS_CLAIM_TIMEOUT = '5 minutes'
+UPLOAD_JOBS_WORKERS = int(os.environ.get('UPLOAD_JOBS_WORKERS', '8'))
+MAX_UPLOAD_ATTEMPTS = 3
+
+# Работа и задание на её загрузку появляются в одной транзакции одним запросом
+ENQUEUE_UPLOAD_SQL = '''
+    WITH artwork AS (
+        INSERT INTO gallery (user_id, title, description, image_url, status)
+        VALUES (%(user_id)s, %(title)s, %(description)s, %(image_url)s, 'pending')
+        RETURNING id
+    ), job AS (
+        INSERT INTO gallery_upload_jobs (gallery_id, object_key, content_type, payload)
+        SELECT id, %(key)s, %(content_type)s, %(payload)s FROM artwork
+    )
+    SELECT id FROM artwork
+'''
+
+
+def enqueue_upload(cur: Any, user_id: Any, title: str, description: str, key: str, image_url: str,
+                   content_type: str, payload: str) -> int:
+    cur.execute(ENQUEUE_UPLOAD_SQL, {
+        'user_id': user_id,
+        'title': title,
+        'description': description,
+        'image_url': image_url,
+        'key': key,
+        'content_type': content_type,
+        'payload': payload
+    })
+    return cur.fetchone()[0]
+
+
+def store(job: Tuple[int, int, str, str, str, int]) -> Optional[str]:
+    '''
+    Декодирует и записывает файл задания в S3; возвращает текст ошибки или None
+    '''
+    _, _, key, content_type, payload, _ = job
+    try:
+        body = base64.b64decode(payload, validate=True)
+    except binascii.Error:
+        body = b''
+    if not body:
+        return 'image is not valid base64'
+    try:
+        get_s3().put_object(Bucket=BUCKET, Key=key, Body=body, ContentType=content_type)
+    except Exception as exc:
+        logger.exception('upload failed for %s', key)
+        return str(exc)[:500]
+    return None
+
+
+def process_uploads(conn: Any, limit: int = UPLOAD_JOBS_BATCH_SIZE) -> Dict[str, int]:
+    '''
+    Забирает до limit заданий (SKIP LOCKED, чтобы параллельные вызовы не делили
+    одни и те же строки; зависшее задание повторяется после UPLOAD_JOBS_CLAIM_TIMEOUT),
+    загружает файлы и переводит работы в ready. Задание с ошибкой повторяется
+    до MAX_UPLOAD_ATTEMPTS раз, после чего работа получает статус failed; так же
+    завершается задание, которое исчерпало попытки, зависая (таймаут или падение обработчика).
+    '''
+    cur = conn.cursor()
+    cur.execute(f'''
+        WITH exhausted AS (
+            UPDATE gallery_upload_jobs SET payload = NULL, last_error = COALESCE(last_error, 'upload timed out')
+            WHERE id IN (
+                SELECT id FROM gallery_upload_jobs
+                WHERE payload IS NOT NULL AND attempts >= %(max_attempts)s
+                AND claimed_at < CURRENT_TIMESTAMP - INTERVAL '{UPLOAD_JOBS_CLAIM_TIMEOUT}'
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING gallery_id
+        )
+        UPDATE gallery SET status = 'failed' WHERE id IN (SELECT gallery_id FROM exhausted)
+    ''', {'max_attempts': MAX_UPLOAD_ATTEMPTS})
+    expired = cur.rowcount
+    cur.execute(f'''
+        UPDATE gallery_upload_jobs SET claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM gallery_upload_jobs
+            WHERE payload IS NOT NULL AND attempts < %(max_attempts)s
+            AND (claimed_at IS NULL
+                 OR claimed_at < CURRENT_TIMESTAMP - INTERVAL '{UPLOAD_JOBS_CLAIM_TIMEOUT}')
+            ORDER BY id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, gallery_id, object_key, content_type, payload, attempts
+    ''', {'max_attempts': MAX_UPLOAD_ATTEMPTS, 'limit': limit})
+    claimed = cur.fetchall()
+    conn.commit()
+
+    if not claimed:
+        cur.close()
+        return {'stored': 0, 'retrying': 0, 'failed': expired}
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_JOBS_WORKERS) as pool:
+        errors = list(pool.map(store, claimed))
+
+    stored: List[int] = [job[1] for job, failure in zip(claimed, errors) if failure is None]
+    retrying: List[Tuple[str, int]] = []
+    failed: List[Tuple[str, int]] = []
+    for job, failure in zip(claimed, errors):
+        if failure is not None:
+            (failed if job[5] >= MAX_UPLOAD_ATTEMPTS else retrying).append((failure, job[0]))
+
+    if stored:
+        cur.execute('DELETE FROM gallery_upload_jobs WHERE gallery_id = ANY(%s)', (stored,))
+        cur.execute("UPDATE gallery SET status = 'ready' WHERE id = ANY(%s)", (stored,))
+    for failure, job_id in retrying:
+        cur.execute('''
+            UPDATE gallery_upload_jobs SET last_error = %s, claimed_at = NULL
+            WHERE id = %s
+        ''', (failure, job_id))
+    for failure, job_id in failed:
+        cur.execute('''
+            WITH job AS (
+                UPDATE gallery_upload_jobs SET last_error = %s, payload = NULL
+                WHERE id = %s
+                RETURNING gallery_id
+            )
+            UPDATE gallery SET status = 'failed' WHERE id = (SELECT gallery_id FROM job)
+        ''', (failure, job_id))
+    conn.commit()
+    cur.close()
+
+    return {'stored': len(stored), 'retrying': len(retrying), 'failed': len(failed) + expired}
+
+
+def upload_status(cur: Any, gallery_id: int) -> Optional[Dict[str, Any]]:
+    cur.execute('''
+        SELECT g.id, g.status, g.image_url, j.attempts, j.last_error
+        FROM gallery g
+        LEFT JOIN gallery_upload_jobs j ON j.gallery_id = g.id
+        WHERE g.id = %s
+    ''', (gallery_id,))
+    row = cur.fetchone()
+
+    if row is None:
+        return None
+    artwork_id, status, image_url, attempts, last_error = row
+    return {
+        'id': artwork_id,
+        'status': status,
+        'image_url': image_url if status == 'ready' else None,
+        'attempts': attempts or 0,
+        'error': last_error if status == 'failed' else None
+    }
@@ -0,0 +1,157 @@
+'''
+Загрузка изображений галереи напрямую в S3 по подписанным ссылкам.
+Файл не проходит через функцию: клиент отправляет его одним PUT или,
+если он больше MULTIPART_THRESHOLD, параллельными частями multipart upload.
+Клиент S3 создаётся при первом обращении (get_s3) и переиспользуется между вызовами:
+импорт botocore и загрузка модели сервиса стоят сотни миллисекунд холодного старта,
+а GET-запросы галереи к S3 не обращаются.
+'''
+import math
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+BUCKET = 'files'
+PRESIGNED_URL_EXPIRES = 900
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+# Длина base64 (с дополнением) файла размером MAX_UPLOAD_SIZE — предел для поля image
+MAX_INLINE_IMAGE_LENGTH = 4 * math.ceil(MAX_UPLOAD_SIZE / 3)
+# Алфавит base64 без пробелов и переносов строк, дополнение «=» только в конце
+BASE64_TEXT = re.compile(r'[A-Za-z0-9+/]*={0,2}')
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+MAX_PARTS = 10000
+
+CONTENT_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/webp': 'webp',
+}
+
+# Переопределяется для локальной замены S3 (MinIO, moto server) при разработке и тестах
+S3_ENDPOINT = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev')
+
+_s3: Optional[Any] = None
+_s3_lock = threading.Lock()
+
+
+def get_s3() -> Any:
+    '''
+    Клиент строится напрямую через сессию botocore, без импорта boto3 и его сессии по умолчанию;
+    ключи передаются явно, поэтому цепочка поиска учётных данных не обходится
+    '''
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                from botocore.session import get_session
+
+                _s3 = get_session().create_client(
+                    's3',
+                    endpoint_url=S3_ENDPOINT,
+                    aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                    aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+                )
+    return _s3
+
+
+def is_base64(value: Any) -> bool:
+    '''
+    Проверка длины и алфавита без декодирования: строка может весить десятки мегабайт,
+    а декодирует её только обработчик очереди (или запрос при ASYNC_UPLOADS=0)
+    '''
+    return (
+        isinstance(value, str) and 0 < len(value) <= MAX_INLINE_IMAGE_LENGTH and len(value) % 4 == 0
+        and BASE64_TEXT.fullmatch(value) is not None
+    )
+
+
+def make_key(user_id: int, extension: str) -> str:
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f'gallery/{user_id}_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}'
+
+
+def is_user_key(key: str, user_id: int) -> bool:
+    return key.startswith(f'gallery/{user_id}_') and '/' not in key[len('gallery/'):]
+
+
+def create_upload(user_id: int, content_type: str, size: int) -> Dict[str, Any]:
+    '''
+    Одна ссылка на PUT для небольших файлов, иначе multipart upload
+    с подписанной ссылкой на каждую часть размером PART_SIZE
+    '''
+    key = make_key(user_id, CONTENT_TYPES[content_type])
+    s3 = get_s3()
+
+    if size <= MULTIPART_THRESHOLD:
+        url = s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': BUCKET, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=PRESIGNED_URL_EXPIRES
+        )
+        return {'key': key, 'url': url}
+
+    upload_id = s3.create_multipart_upload(Bucket=BUCKET, Key=key, ContentType=content_type)['UploadId']
+    part_urls = [
+        s3.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': BUCKET, 'Key': key, 'UploadId': upload_id, 'PartNumber': part_number},
+            ExpiresIn=PRESIGNED_URL_EXPIRES
+        )
+        for part_number in range(1, math.ceil(size / PART_SIZE) + 1)
+    ]
+    return {'key': key, 'upload_id': upload_id, 'part_size': PART_SIZE, 'part_urls': part_urls}
+
+
+def valid_parts(parts: Any) -> bool:
+    '''
+    Непустой список {part_number, etag} с различными номерами частей от 1 до MAX_PARTS
+    '''
+    if not isinstance(parts, list) or not 0 < len(parts) <= MAX_PARTS:
+        return False
+    numbers = set()
+    for part in parts:
+        if not isinstance(part, dict) or not isinstance(part.get('etag'), str) or not part['etag']:
+            return False
+        number = str(part.get('part_number'))
+        if not number.isdigit() or not 0 < int(number) <= MAX_PARTS or int(number) in numbers:
+            return False
+        numbers.add(int(number))
+    return True
+
+
+def complete_upload(key: str, upload_id: str, parts: List[Dict[str, Any]]) -> bool:
+    '''
+    parts проверяются valid_parts заранее; False — S3 отклонил сборку
+    (неизвестный upload_id, неверный ETag или не загруженная часть)
+    '''
+    from botocore.exceptions import ClientError
+
+    try:
+        get_s3().complete_multipart_upload(
+            Bucket=BUCKET,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [
+                    {'PartNumber': int(part['part_number']), 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda part: int(part['part_number']))
+                ]
+            }
+        )
+        return True
+    except ClientError:
+        return False
+
+
+def object_exists(key: str) -> bool:
+    from botocore.exceptions import ClientError
+
+    try:
+        get_s3().head_object(Bucket=BUCKET, Key=key)
+        return True
+    except ClientError:
+        return False
@@ -1,100 +1,137 @@
-import json
-import os
-import psycopg2
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+from cache import CATALOG_CACHE_TTL, CachedBody, CatalogCache
+from http_cache import CATALOG_CACHE_CONTROL, etag_matches, make_etag, not_modified
+from runtime import Request, Router, RowMapper, connection, error, respond
+from search import MAX_QUERY_LENGTH, SEARCH_CACHE_CONTROL, parse_search, search_page, search_sql
+from serializer import dumps
+
+catalog_cache = CatalogCache(CATALOG_CACHE_TTL)
+
+
+LESSON_COLUMNS = ('id', 'title', 'description', 'content', 'duration', 'difficulty', 'icon', 'order_index')
+SUMMARY_COLUMNS = tuple(column for column in LESSON_COLUMNS if column != 'content')
+
+
+def parse_fields(params: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
     '''
-    API для работы с уроками рисования
-    GET / - получить все уроки
-    GET /?id=1 - получить урок по ID
+    Колонки для списка уроков: fields=title,icon или view=summary (всё, кроме content)
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    if params.get('view') == 'summary':
+        return SUMMARY_COLUMNS
     
-    if method != 'GET':
-        return {
-            'statusCode': 405,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+    raw = params.get('fields')
+    if not raw:
+        return LESSON_COLUMNS
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cur = conn.cursor()
-    
-    params = event.get('queryStringParameters', {}) or {}
-    lesson_id = params.get('id')
+    requested = {field.strip() for field in raw.split(',')} | {'id'}
+    if not requested <= set(LESSON_COLUMNS):
+        return None
+    return tuple(column for column in LESSON_COLUMNS if column in requested)
+
+
+LESSON_MAPPERS: Dict[Tuple[str, ...], RowMapper] = {}
+
+
+def get_mapper(columns: Tuple[str, ...]) -> RowMapper:
+    mapper = LESSON_MAPPERS.get(columns)
+    if mapper is None:
+        mapper = LESSON_MAPPERS[columns] = RowMapper(columns)
+    return mapper
+
+
+def load_lessons(columns: Tuple[str, ...]) -> str:
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(f'''
+            SELECT {', '.join(columns)}
+            FROM lessons
+            ORDER BY order_index
+        ''')
+        rows = cur.fetchall()
     
-    if lesson_id:
+    return dumps(get_mapper(columns).many(rows))
+
+
+def load_lesson(lesson_id: int) -> Optional[str]:
+    with connection() as conn, conn.cursor() as cur:
         cur.execute('''
             SELECT id, title, description, content, duration, difficulty, icon, order_index
             FROM lessons
             WHERE id = %s
         ''', (lesson_id,))
         row = cur.fetchone()
-        
-        if row:
-            lesson = {
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'content': row[3],
-                'duration': row[4],
-                'difficulty': row[5],
-                'icon': row[6],
-                'order_index': row[7]
-            }
-            result = lesson
-        else:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Lesson not found'}),
-                'isBase64Encoded': False
-            }
-    else:
-        cur.execute('''
-            SELECT id, title, description, content, duration, difficulty, icon, order_index
-            FROM lessons
-            ORDER BY order_index
-        ''')
+    
+    if not row:
+        return None
+    return dumps(get_mapper(LESSON_COLUMNS)(row))
+
+
+SEARCH_SQL = search_sql(
+    'lessons',
+    ', '.join(f't.{column}' for column in SUMMARY_COLUMNS),
+    "concat_ws(' ', t.description, t.content)",
+    't.order_index'
+)
+
+
+def cached_response(request: Request, cached: CachedBody) -> Dict[str, Any]:
+    if etag_matches(request.event, cached.etag):
+        return not_modified(cached.etag, CATALOG_CACHE_CONTROL)
+    return respond(200, headers={'ETag': cached.etag, 'Cache-Control': CATALOG_CACHE_CONTROL}, body=cached.body)
+
+
+router = Router()
+
+
+@router.get('search')
+def search_lessons(request: Request) -> Dict[str, Any]:
+    query = parse_search(request.params)
+    
+    if query is None:
+        return error(400, f'q (up to {MAX_QUERY_LENGTH} characters), limit and offset required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(SEARCH_SQL, {'q': query.text, 'limit': query.limit, 'offset': query.offset})
         rows = cur.fetchall()
+    
+    body = dumps(search_page(query, get_mapper(SUMMARY_COLUMNS), rows))
+    etag = make_etag(body)
+    if etag_matches(request.event, etag):
+        return not_modified(etag, SEARCH_CACHE_CONTROL)
+    
+    return respond(200, headers={'ETag': etag, 'Cache-Control': SEARCH_CACHE_CONTROL}, body=body)
+
+
+@router.get()
+def get_lessons(request: Request) -> Dict[str, Any]:
+    lesson_id = request.params.get('id')
+    
+    if lesson_id:
+        if not lesson_id.isdigit():
+            return error(400, 'id must be an integer')
         
-        lessons = []
-        for row in rows:
-            lessons.append({
-                'id': row[0],
-                'title': row[1],
-                'description': row[2],
-                'content': row[3],
-                'duration': row[4],
-                'difficulty': row[5],
-                'icon': row[6],
-                'order_index': row[7]
-            })
-        result = lessons
+        lesson_id = int(lesson_id)
+        cached = catalog_cache.get_or_load(f'lesson:{lesson_id}', lambda: load_lesson(lesson_id))
+        
+        if cached is None:
+            return error(404, 'Lesson not found')
+        return cached_response(request, cached)
+    
+    columns = parse_fields(request.params)
     
-    cur.close()
-    conn.close()
+    if columns is None:
+        return error(400, f'fields must be a subset of {", ".join(LESSON_COLUMNS)}')
     
-    return {
-        'statusCode': 200,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps(result, ensure_ascii=False),
-        'isBase64Encoded': False
-    }
+    return cached_response(request, catalog_cache.get_or_load('lessons:' + ','.join(columns), lambda: load_lessons(columns)))
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для работы с уроками рисования
+    GET / - получить все уроки
+    GET /?view=summary - получить все уроки без текста (content)
+    GET /?fields=title,icon - получить все уроки только с указанными полями
+    GET /?id=1 - получить урок по ID
+    GET /?action=search&q=светотень&limit=20&offset=0 - поиск по названию, описанию и тексту уроков
+    '''
+    return router.dispatch(event)
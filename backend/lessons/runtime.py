@@ -0,0 +1,168 @@
+'''
+Общий каркас обработчиков: маршрутизация по методу и ?action=, ответы с CORS,
+соединение из пула в контекстном менеджере и заранее собранные отображения строк в JSON.
+'''
+import os
+import time
+from functools import wraps
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import querylog
+from db import get_connection, release_connection
+from serializer import dumps, loads
+
+CORS_MAX_AGE = '86400'
+
+
+def respond(status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None, body: Optional[str] = None) -> Dict[str, Any]:
+    '''
+    Ответ функции; body — уже сериализованный JSON, иначе сериализуется payload
+    '''
+    return {
+        'statusCode': status,
+        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json', **(headers or {})},
+        'body': dumps(payload) if body is None else body,
+        'isBase64Encoded': False
+    }
+
+
+def error(status: int, message: str) -> Dict[str, Any]:
+    return respond(status, {'error': message})
+
+
+@contextmanager
+def connection() -> Iterator[Any]:
+    '''
+    Соединение из пула; незавершённая транзакция откатывается при возврате в пул
+    '''
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
+
+class RowMapper:
+    '''
+    Отображение кортежа строки в словарь по списку колонок запроса.
+    Позиции колонок с преобразованием (например, srcset из списка копий)
+    вычисляются один раз при создании, а не на каждой строке.
+    '''
+
+    def __init__(self, columns: Sequence[str], **converters: Callable[[Any], Any]):
+        self.columns = tuple(columns)
+        self._converters: Tuple[Tuple[str, Callable[[Any], Any], Callable[[Any], Any]], ...] = tuple(
+            (name, itemgetter(self.columns.index(name)), convert) for name, convert in converters.items()
+        )
+
+    def __call__(self, row: Sequence[Any]) -> Dict[str, Any]:
+        item = dict(zip(self.columns, row))
+        for name, get, convert in self._converters:
+            item[name] = convert(get(row))
+        return item
+
+    def many(self, rows: Sequence[Sequence[Any]]) -> List[Dict[str, Any]]:
+        return [self(row) for row in rows]
+
+
+class Request:
+    __slots__ = ('event', 'method', 'params', '_body')
+
+    def __init__(self, event: Dict[str, Any]):
+        self.event = event
+        self.method: str = event.get('httpMethod', 'GET')
+        self.params: Dict[str, str] = event.get('queryStringParameters') or {}
+        self._body: Optional[Dict[str, Any]] = None
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        if self._body is None:
+            self._body = loads(self.event.get('body') or '{}')
+        return self._body
+
+    def header(self, name: str) -> Optional[str]:
+        name = name.lower()
+        for key, value in (self.event.get('headers') or {}).items():
+            if key.lower() == name:
+                return value
+        return None
+
+    def is_worker(self) -> bool:
+        '''
+        Вызов по расписанию: заголовок X-Worker-Token совпадает с секретом WORKER_TOKEN
+        '''
+        worker_token = os.environ.get('WORKER_TOKEN')
+        return bool(worker_token) and self.header('X-Worker-Token') == worker_token
+
+
+Route = Callable[[Request], Dict[str, Any]]
+
+
+class Router:
+    '''
+    Таблица маршрутов (метод, action). Запрос с неизвестным action обрабатывается
+    маршрутом метода без action; время обработки и запросов к БД отдаётся в заголовке
+    Server-Timing и в строке журнала querylog.
+    '''
+
+    def __init__(self, allow_headers: str = 'Content-Type'):
+        self.allow_headers = allow_headers
+        self.routes: Dict[Tuple[str, Optional[str]], Route] = {}
+
+    def route(self, method: str, action: Optional[str] = None, worker: bool = False) -> Callable[[Route], Route]:
+        def register(func: Route) -> Route:
+            if worker:
+                @wraps(func)
+                def guarded(request: Request) -> Dict[str, Any]:
+                    if not request.is_worker():
+                        return error(403, 'Forbidden')
+                    return func(request)
+                self.routes[(method, action)] = guarded
+            else:
+                self.routes[(method, action)] = func
+            return func
+        return register
+
+    def get(self, action: Optional[str] = None, worker: bool = False) -> Callable[[Route], Route]:
+        return self.route('GET', action, worker)
+
+    def post(self, action: Optional[str] = None, worker: bool = False) -> Callable[[Route], Route]:
+        return self.route('POST', action, worker)
+
+    def preflight(self) -> Dict[str, Any]:
+        methods = sorted({method for method, _ in self.routes})
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': ', '.join(methods + ['OPTIONS']),
+                'Access-Control-Allow-Headers': self.allow_headers,
+                'Access-Control-Max-Age': CORS_MAX_AGE
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    def dispatch(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        request = Request(event)
+
+        if request.method == 'OPTIONS':
+            return self.preflight()
+
+        route = self.routes.get((request.method, request.params.get('action'))) or self.routes.get((request.method, None))
+        if route is None:
+            return error(405, 'Method not allowed')
+
+        stats = querylog.begin()
+        try:
+            response = route(request)
+        finally:
+            querylog.end()
+        app_ms = (time.perf_counter() - started) * 1000
+        response['headers']['Server-Timing'] = f'app;dur={app_ms:.2f}, {stats.server_timing()}'
+        response['headers']['Timing-Allow-Origin'] = '*'
+        querylog.emit(stats, route.__name__, response['statusCode'], app_ms)
+        return response
@@ -0,0 +1,75 @@
+'''
+Полнотекстовый поиск по каталогу. Документ хранится в сгенерированной колонке search_vector
+(конфигурация russian, GIN-индекс), запрос разбирается websearch_to_tsquery:
+слова, "точные фразы", OR и -исключение. Результаты упорядочены по ts_rank_cd,
+фрагменты с подсветкой строит ts_headline только для строк текущей страницы.
+'''
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from runtime import RowMapper
+
+SEARCH_CONFIG = 'russian'
+MAX_QUERY_LENGTH = 200
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SEARCH_MAX_OFFSET = 1000
+SEARCH_CACHE_CONTROL = 'public, max-age=60'
+# Совпадения оборачиваются в <mark>, до двух фрагментов по 10–25 слов
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MinWords=10, MaxWords=25, MaxFragments=2, FragmentDelimiter=" … "'
+
+
+class SearchQuery(NamedTuple):
+    text: str
+    limit: int
+    offset: int
+
+
+def parse_search(params: Dict[str, Any]) -> Optional[SearchQuery]:
+    text = ' '.join(params.get('q', '').split())
+    limit = params.get('limit', str(SEARCH_PAGE_SIZE))
+    offset = params.get('offset', '0')
+
+    if not text or len(text) > MAX_QUERY_LENGTH or not limit.isdigit() or not offset.isdigit():
+        return None
+    return SearchQuery(text, max(1, min(int(limit), SEARCH_MAX_PAGE_SIZE)), min(int(offset), SEARCH_MAX_OFFSET))
+
+
+def search_sql(table: str, columns: str, snippet: str, order: str) -> str:
+    '''
+    Страница совпадений с общим числом найденного; ts_headline считается во внешнем запросе,
+    то есть только для строк страницы, а не для всех совпадений
+    '''
+    return f'''
+        WITH query AS (
+            SELECT websearch_to_tsquery('{SEARCH_CONFIG}', %(q)s) AS q
+        ), page AS (
+            SELECT t.id, ts_rank_cd(t.search_vector, query.q) AS rank, COUNT(*) OVER () AS total
+            FROM {table} t, query
+            WHERE t.search_vector @@ query.q
+            ORDER BY rank DESC, {order}
+            LIMIT %(limit)s OFFSET %(offset)s
+        )
+        SELECT {columns}, page.rank,
+               ts_headline('{SEARCH_CONFIG}', {snippet}, query.q, '{HEADLINE_OPTIONS}'),
+               page.total
+        FROM page
+        JOIN {table} t ON t.id = page.id
+        CROSS JOIN query
+        ORDER BY page.rank DESC, {order}
+    '''
+
+
+def search_page(query: SearchQuery, mapper: RowMapper, rows: List[tuple]) -> Dict[str, Any]:
+    '''
+    rows — строки search_sql: колонки mapper, затем rank, snippet и total
+    '''
+    return {
+        'query': query.text,
+        'total': rows[0][-1] if rows else 0,
+        'limit': query.limit,
+        'offset': query.offset,
+        'results': [
+            {**mapper(row), 'rank': round(row[-3], 4), 'snippet': row[-2]}
+            for row in rows
+        ]
+    }
@@ -0,0 +1,119 @@
+'''
+Движок достижений: правила из таблицы achievements индексируются по типу требования
+один раз на тёплый контейнер, событие проверяет только правила своего типа.
+'''
+import os
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+ACHIEVEMENTS_TTL = float(os.environ.get('ACHIEVEMENTS_TTL', '300'))
+
+# Требования, которые выполняются совпадением значения, а не достижением порога
+EXACT_REQUIREMENTS = {'specific_lesson'}
+
+# CTE выдачи достижений внутри запроса завершения, без отдельного INSERT. Ставится после CTE
+# achievement_values (requirement_type, value) со значениями счётчиков после события и ожидает
+# %(user_id)s и массивы правил из AchievementEngine.rule_params; выданные — awarded.achievement_id.
+AWARD_CTES = '''
+    awarded AS (
+        INSERT INTO user_achievements (user_id, achievement_id)
+        SELECT %(user_id)s, rule.id
+        FROM unnest(%(rule_ids)s::int[], %(rule_types)s::text[], %(rule_values)s::int[], %(rule_exact)s::boolean[])
+             AS rule (id, requirement_type, requirement_value, exact)
+        JOIN achievement_values reached ON reached.requirement_type = rule.requirement_type
+        WHERE CASE WHEN rule.exact THEN rule.requirement_value = reached.value
+                   ELSE rule.requirement_value <= reached.value END
+        ON CONFLICT (user_id, achievement_id) DO NOTHING
+        RETURNING achievement_id
+    )
+'''
+
+
+class AchievementRule(NamedTuple):
+    id: int
+    name: str
+    requirement_type: str
+    requirement_value: int
+
+
+class AchievementEngine:
+    '''
+    Для пороговых требований (lessons_completed, exercises_completed, daily_streak,
+    total_likes) правила отсортированы по порогу, и значение через bisect получает
+    все правила с порогом не выше него: уже выданные отсекает award, а пропущенные
+    раньше (новое правило, потерянная выдача) выдаются при следующем событии.
+    '''
+
+    def __init__(self, rules: List[AchievementRule]):
+        self.rules = {rule.id: rule for rule in rules}
+        self._thresholds: Dict[str, Tuple[List[int], List[AchievementRule]]] = {}
+        self._exact: Dict[str, Dict[int, List[AchievementRule]]] = {}
+
+        for rule in sorted(rules, key=lambda r: r.requirement_value):
+            if rule.requirement_type in EXACT_REQUIREMENTS:
+                by_value = self._exact.setdefault(rule.requirement_type, {})
+                by_value.setdefault(rule.requirement_value, []).append(rule)
+            else:
+                values, ordered = self._thresholds.setdefault(rule.requirement_type, ([], []))
+                values.append(rule.requirement_value)
+                ordered.append(rule)
+
+    def reached(self, requirement_type: str, value: int) -> List[AchievementRule]:
+        if requirement_type not in self._thresholds:
+            return []
+        values, ordered = self._thresholds[requirement_type]
+        return ordered[:bisect_right(values, value)]
+
+    def matched(self, requirement_type: str, value: int) -> List[AchievementRule]:
+        return self._exact.get(requirement_type, {}).get(value, [])
+
+    def rule_params(self, *requirement_types: str) -> Dict[str, List[Any]]:
+        '''
+        Параметры AWARD_CTES: только правила типов, на которые влияет событие
+        '''
+        rules = [
+            rule
+            for requirement_type in requirement_types
+            for rule in (
+                [rule for rules in self._exact.get(requirement_type, {}).values() for rule in rules]
+                if requirement_type in EXACT_REQUIREMENTS
+                else self._thresholds.get(requirement_type, ([], []))[1]
+            )
+        ]
+        return {
+            'rule_ids': [rule.id for rule in rules],
+            'rule_types': [rule.requirement_type for rule in rules],
+            'rule_values': [rule.requirement_value for rule in rules],
+            'rule_exact': [rule.requirement_type in EXACT_REQUIREMENTS for rule in rules],
+        }
+
+    def describe(self, achievement_ids: List[int]) -> List[Dict[str, Any]]:
+        return [{'id': achievement_id, 'name': self.rules[achievement_id].name} for achievement_id in sorted(achievement_ids)]
+
+    def award(self, cur: Any, user_id: int, rules: List[AchievementRule]) -> List[Dict[str, Any]]:
+        '''
+        Выдаёт достижения одним INSERT; уже полученные отсекает UNIQUE(user_id, achievement_id)
+        '''
+        if not rules:
+            return []
+        cur.execute('''
+            INSERT INTO user_achievements (user_id, achievement_id)
+            SELECT %s, unnest(%s::int[])
+            ON CONFLICT (user_id, achievement_id) DO NOTHING
+            RETURNING achievement_id
+        ''', (user_id, [rule.id for rule in rules]))
+        return self.describe([row[0] for row in cur.fetchall()])
+
+
+_engine: Optional[AchievementEngine] = None
+_loaded_at = 0.0
+
+
+def get_engine(cur: Any) -> AchievementEngine:
+    global _engine, _loaded_at
+    if _engine is None or time.monotonic() - _loaded_at > ACHIEVEMENTS_TTL:
+        cur.execute('SELECT id, name, requirement_type, requirement_value FROM achievements')
+        _engine = AchievementEngine([AchievementRule(*row) for row in cur.fetchall()])
+        _loaded_at = time.monotonic()
+    return _engine
@@ -0,0 +1,122 @@
+'''
+Пул соединений с PostgreSQL, переживающий тёплые вызовы функции.
+'''
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from querylog import InstrumentedCursor, record_connect
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', '30'))
+
+
+class ConnectionPool:
+    '''
+    Хранит простаивающие соединения между вызовами.
+    Соединение, простоявшее дольше idle_timeout, закрывается;
+    простоявшее дольше healthcheck_interval проверяется запросом SELECT 1.
+    '''
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, healthcheck_interval: float):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._idle: List[Tuple[Any, float]] = []
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'reconnects': 0, 'expired': 0}
+
+    def acquire(self) -> Any:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.stats['misses'] += 1
+                    break
+                conn, released_at = self._idle.pop()
+
+            idle_for = time.monotonic() - released_at
+            if conn.closed or idle_for > self.idle_timeout:
+                self._close(conn)
+                with self._lock:
+                    self.stats['expired'] += 1
+                continue
+            if idle_for > self.healthcheck_interval and not self._is_healthy(conn):
+                self._close(conn)
+                with self._lock:
+                    self.stats['reconnects'] += 1
+                continue
+
+            with self._lock:
+                self.stats['hits'] += 1
+            return conn
+
+        started = time.monotonic()
+        conn = psycopg2.connect(self.dsn, cursor_factory=InstrumentedCursor)
+        elapsed_ms = (time.monotonic() - started) * 1000
+        record_connect(elapsed_ms)
+        logger.info('db pool connect: %.1f ms, stats=%s', elapsed_ms, self.stats)
+        return conn
+
+    def release(self, conn: Any) -> None:
+        if conn.closed:
+            return
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._close(conn)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._close(conn)
+
+    def _is_healthy(self, conn: Any) -> bool:
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _close(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            os.environ['DATABASE_URL'],
+            DB_POOL_MAX_SIZE,
+            DB_POOL_IDLE_TIMEOUT,
+            DB_POOL_HEALTHCHECK_INTERVAL,
+        )
+    return _pool
+
+
+def get_connection() -> Any:
+    return get_pool().acquire()
+
+
+def release_connection(conn: Any) -> None:
+    get_pool().release(conn)
@@ -1,200 +1,191 @@
-import json
-import os
-import psycopg2
-from datetime import datetime
 from typing import Dict, Any
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+from achievements import AWARD_CTES, get_engine
+from recommendations import REFRESH_RECOMMENDATIONS_CTE, load_recommendations, refresh_recommendations
+from rows import USER_ACHIEVEMENTS_SQL, achievements_body
+from runtime import Request, Router, RowMapper, connection, error, respond
+from streaks import STREAK_CTES, streak_params
+from sync import LESSON_XP, MAX_SYNC_EVENTS, apply_batch
+
+STREAK_REBUILD_BATCH_SIZE = 1000
+
+# Завершение урока за один запрос: прогресс, XP, счётчик user_stats, недельный XP, серия дней,
+# а при первом завершении урока ещё достижения за уроки и пересчёт рекомендаций
+COMPLETE_LESSON_SQL = '''
+    WITH ''' + STREAK_CTES + ''', previous AS (
+        SELECT completed FROM user_progress
+        WHERE user_id = %(user_id)s AND lesson_id = %(lesson_id)s
+    ), first_completion AS (
+        SELECT NOT EXISTS (SELECT 1 FROM previous WHERE completed) AS is_first
+    ), progress AS (
+        INSERT INTO user_progress (user_id, lesson_id, completed, completed_at, rating)
+        VALUES (%(user_id)s, %(lesson_id)s, true, CURRENT_TIMESTAMP AT TIME ZONE 'UTC', %(rating)s)
+        ON CONFLICT (user_id, lesson_id) 
+        DO UPDATE SET completed = true, completed_at = EXCLUDED.completed_at, rating = %(rating)s
+        RETURNING id
+    ), xp AS (
+        UPDATE users
+        SET total_xp = total_xp + %(xp)s
+        WHERE id = %(user_id)s
+    ), stats AS (
+        INSERT INTO user_stats (user_id, completed_lessons)
+        SELECT %(user_id)s, CASE WHEN is_first THEN 1 ELSE 0 END FROM first_completion
+        ON CONFLICT (user_id) DO UPDATE
+        SET completed_lessons = user_stats.completed_lessons + EXCLUDED.completed_lessons,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING completed_lessons
+    ), weekly AS (
+        INSERT INTO user_xp_weekly (week_start, user_id, xp)
+        VALUES (leaderboard_week_start(), %(user_id)s, %(xp)s)
+        ON CONFLICT (week_start, user_id) DO UPDATE
+        SET xp = user_xp_weekly.xp + EXCLUDED.xp
+    ), achievement_values (requirement_type, value) AS (
+        SELECT 'daily_streak', current_streak FROM streak
+        UNION ALL
+        SELECT 'lessons_completed', completed_lessons FROM stats, first_completion WHERE is_first
+        UNION ALL
+        SELECT 'specific_lesson', %(lesson_id)s::int FROM first_completion WHERE is_first
+    ), ''' + AWARD_CTES + ''', ''' + REFRESH_RECOMMENDATIONS_CTE + '''
+    SELECT (SELECT id FROM progress),
+           (SELECT current_streak FROM streak),
+           ARRAY(SELECT achievement_id FROM awarded),
+           (SELECT count(*) FROM recommendations)
+'''
+
+PROGRESS_ROW = RowMapper(('lesson_id', 'completed', 'completed_at', 'rating'))
+
+
+def rebuild_streaks(conn: Any) -> int:
     '''
-    API для прогресса и достижений пользователя
-    POST / - отметить урок как завершенный с разблокировкой достижений
-    GET /?user_id=1 - получить прогресс пользователя
-    GET /?user_id=1&action=achievements - получить достижения
+    Пересчитывает user_streaks по истории пачками пользователей, по транзакции на пачку
     '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
     cur = conn.cursor()
+    last_user_id = 0
+    batches = 0
     
-    if method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        user_id = body_data.get('user_id')
-        lesson_id = body_data.get('lesson_id')
-        rating = body_data.get('rating')
-        
-        if not user_id or not lesson_id:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'user_id and lesson_id required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute('''
-            INSERT INTO user_progress (user_id, lesson_id, completed, completed_at, rating)
-            VALUES (%s, %s, true, %s, %s)
-            ON CONFLICT (user_id, lesson_id) 
-            DO UPDATE SET completed = true, completed_at = %s, rating = %s
-            RETURNING id
-        ''', (user_id, lesson_id, datetime.now(), rating, datetime.now(), rating))
-        
-        progress_id = cur.fetchone()[0]
-        
-        cur.execute('''
-            UPDATE users
-            SET total_xp = total_xp + 100
-            WHERE id = %s
-        ''', (user_id,))
-        
+    while last_user_id is not None:
+        cur.execute('SELECT rebuild_user_streaks(%s, %s)', (last_user_id, STREAK_REBUILD_BATCH_SIZE))
+        last_user_id = cur.fetchone()[0]
         conn.commit()
-        
-        cur.execute('''
-            SELECT COUNT(*) FROM user_progress WHERE user_id = %s AND completed = true
-        ''', (user_id,))
-        completed_lessons = cur.fetchone()[0]
-        
-        cur.execute('''
-            SELECT a.id, a.name, a.requirement_type, a.requirement_value
-            FROM achievements a
-            WHERE NOT EXISTS (
-                SELECT 1 FROM user_achievements ua 
-                WHERE ua.user_id = %s AND ua.achievement_id = a.id
-            )
-        ''', (user_id,))
-        
-        pending_achievements = cur.fetchall()
-        new_achievements = []
-        
-        for ach in pending_achievements:
-            ach_id, ach_name, req_type, req_value = ach
-            should_unlock = False
-            
-            if req_type == 'lessons_completed' and completed_lessons >= req_value:
-                should_unlock = True
-            elif req_type == 'specific_lesson' and lesson_id == req_value:
-                should_unlock = True
-            
-            if should_unlock:
-                cur.execute('''
-                    INSERT INTO user_achievements (user_id, achievement_id)
-                    VALUES (%s, %s)
-                ''', (user_id, ach_id))
-                new_achievements.append({'id': ach_id, 'name': ach_name})
-        
+        batches += 1
+    
+    cur.close()
+    return batches - 1
+
+
+router = Router(allow_headers='Content-Type, X-User-Id')
+
+
+@router.post('rebuild-streaks', worker=True)
+def rebuild_streaks_route(request: Request) -> Dict[str, Any]:
+    with connection() as conn:
+        batches = rebuild_streaks(conn)
+    return respond(200, {'batches': batches})
+
+
+@router.post('sync')
+def sync_completions(request: Request) -> Dict[str, Any]:
+    events = request.body.get('events')
+    
+    if not isinstance(events, list) or not 0 < len(events) <= MAX_SYNC_EVENTS:
+        return error(400, f'events must be a list of 1 to {MAX_SYNC_EVENTS} completions')
+    
+    with connection() as conn, conn.cursor() as cur:
+        result = apply_batch(cur, events, request.body.get('user_id'), request.body.get('timezone'))
+        if result['users']:
+            refresh_recommendations(cur, [item['user_id'] for item in result['users']])
+        conn.commit()
+    
+    return respond(200, result)
+
+
+@router.post()
+def complete_lesson(request: Request) -> Dict[str, Any]:
+    user_id = request.body.get('user_id')
+    lesson_id = request.body.get('lesson_id')
+    
+    if not user_id or not lesson_id:
+        return error(400, 'user_id and lesson_id required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        engine = get_engine(cur)
+        cur.execute(COMPLETE_LESSON_SQL, {
+            'lesson_id': lesson_id,
+            'rating': request.body.get('rating'),
+            'xp': LESSON_XP,
+            'completed_lesson_id': lesson_id,
+            'completed_exercise_id': None,
+            **engine.rule_params('daily_streak', 'lessons_completed', 'specific_lesson'),
+            **streak_params(user_id, request.body.get('timezone'))
+        })
+        progress_id, streak, awarded, _ = cur.fetchone()
+        new_achievements = engine.describe(awarded)
+        conn.commit()
+    
+    return respond(200, {
+        'id': progress_id,
+        'xp_earned': LESSON_XP,
+        'streak': streak,
+        'new_achievements': new_achievements
+    })
+
+
+@router.get('achievements')
+def get_achievements(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('user_id')
+    
+    if not user_id:
+        return error(400, 'user_id required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(USER_ACHIEVEMENTS_SQL, (user_id,))
+        rows = cur.fetchall()
+    
+    return respond(200, body=achievements_body(rows))
+
+
+@router.get('recommendations')
+def get_recommendations(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('user_id', '')
+    
+    if not user_id.isdigit():
+        return error(400, 'user_id required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        recommendations = load_recommendations(cur, int(user_id))
         conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps({
-                'id': progress_id,
-                'xp_earned': 100,
-                'new_achievements': new_achievements
-            }, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
-    
-    if method == 'GET':
-        params = event.get('queryStringParameters', {}) or {}
-        user_id = params.get('user_id')
-        action = params.get('action')
-        
-        if not user_id:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'user_id required'}),
-                'isBase64Encoded': False
-            }
-        
-        if action == 'achievements':
-            cur.execute('''
-                SELECT a.id, a.name, a.description, a.icon, a.requirement_type, a.requirement_value,
-                       CASE WHEN ua.id IS NOT NULL THEN true ELSE false END as unlocked,
-                       ua.unlocked_at
-                FROM achievements a
-                LEFT JOIN user_achievements ua ON a.id = ua.achievement_id AND ua.user_id = %s
-                ORDER BY a.id
-            ''', (user_id,))
-            
-            rows = cur.fetchall()
-            achievements = []
-            
-            for row in rows:
-                achievements.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'description': row[2],
-                    'icon': row[3],
-                    'requirement_type': row[4],
-                    'requirement_value': row[5],
-                    'unlocked': row[6],
-                    'unlocked_at': row[7].isoformat() if row[7] else None
-                })
-            
-            cur.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps(achievements, ensure_ascii=False),
-                'isBase64Encoded': False
-            }
-        
+    
+    if recommendations is None:
+        return error(404, 'User not found')
+    return respond(200, recommendations, headers={'Cache-Control': 'private, no-cache'})
+
+
+@router.get()
+def get_progress(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('user_id')
+    
+    if not user_id:
+        return error(400, 'user_id required')
+    
+    with connection() as conn, conn.cursor() as cur:
         cur.execute('''
             SELECT lesson_id, completed, completed_at, rating
             FROM user_progress
             WHERE user_id = %s
         ''', (user_id,))
-        
         rows = cur.fetchall()
-        progress = []
-        
-        for row in rows:
-            progress.append({
-                'lesson_id': row[0],
-                'completed': row[1],
-                'completed_at': row[2].isoformat() if row[2] else None,
-                'rating': row[3]
-            })
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(progress, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
     
-    cur.close()
-    conn.close()
-    
-    return {
-        'statusCode': 405,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
\ No newline at end of file
+    return respond(200, PROGRESS_ROW.many(rows))
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для прогресса и достижений пользователя
+    POST / - отметить урок как завершенный с разблокировкой достижений
+    POST /?action=sync - применить пакет завершений уроков и упражнений (events) одной транзакцией
+    POST /?action=rebuild-streaks - пересчитать серии дней по истории (X-Worker-Token)
+    GET /?user_id=1 - получить прогресс пользователя
+    GET /?user_id=1&action=achievements - получить достижения
+    GET /?user_id=1&action=recommendations - следующие уроки и упражнения (id в порядке рекомендации)
+    '''
+    return router.dispatch(event)
@@ -0,0 +1,66 @@
+'''
+Рекомендации «что дальше» для пользователя: следующие уроки и упражнения с учётом
+пройденного и сложности. Хранятся готовыми в user_recommendations и пересчитываются
+функцией refresh_user_recommendations только для пользователей, чьё завершение их изменило;
+чтение — один запрос по первичному ключу. Запись старше RECOMMENDATIONS_TTL
+(например, после пополнения каталога) пересчитывается при чтении.
+'''
+import os
+from typing import Any, Dict, Iterable, Optional
+
+RECOMMENDED_LESSONS = 3
+RECOMMENDED_EXERCISES = 3
+RECOMMENDATIONS_TTL = int(os.environ.get('RECOMMENDATIONS_TTL', '86400'))
+
+# CTE пересчёта для вставки в WITH запроса завершения: выполняется, только если CTE first_completion
+# (is_first) сообщает о первом завершении, и должен упоминаться в итоговом SELECT.
+# Запись завершения в том же запросе пересчёту может быть не видна, поэтому завершённые урок
+# и упражнение передаются явно: %(user_id)s, %(completed_lesson_id)s, %(completed_exercise_id)s.
+REFRESH_RECOMMENDATIONS_CTE = f'''
+    recommendations AS (
+        SELECT refresh_user_recommendations(
+            ARRAY[%(user_id)s]::integer[], {RECOMMENDED_LESSONS}, {RECOMMENDED_EXERCISES},
+            %(completed_lesson_id)s, %(completed_exercise_id)s
+        )
+        FROM first_completion
+        WHERE first_completion.is_first
+    )
+'''
+
+
+def refresh_recommendations(cur: Any, user_ids: Iterable[int]) -> None:
+    '''
+    Вызывается в транзакции завершения после записи прогресса, чтобы пересчёт видел новую строку
+    '''
+    cur.execute(
+        'SELECT refresh_user_recommendations(%s::integer[], %s, %s)',
+        ([int(user_id) for user_id in user_ids], RECOMMENDED_LESSONS, RECOMMENDED_EXERCISES)
+    )
+
+
+def load_recommendations(cur: Any, user_id: int) -> Optional[Dict[str, Any]]:
+    '''
+    Готовая запись или пересчёт для нового пользователя и устаревшей записи;
+    после пересчёта вызывающий фиксирует транзакцию. None — пользователя нет
+    '''
+    cur.execute('''
+        SELECT level, lesson_ids, exercise_ids, updated_at,
+               updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+        FROM user_recommendations
+        WHERE user_id = %s
+    ''', (RECOMMENDATIONS_TTL, user_id))
+    row = cur.fetchone()
+
+    if row is None or row[4]:
+        refresh_recommendations(cur, [user_id])
+        cur.execute('''
+            SELECT level, lesson_ids, exercise_ids, updated_at, false
+            FROM user_recommendations
+            WHERE user_id = %s
+        ''', (user_id,))
+        row = cur.fetchone()
+
+    if row is None:
+        return None
+    level, lesson_ids, exercise_ids, updated_at, _ = row
+    return {'level': level, 'lesson_ids': lesson_ids, 'exercise_ids': exercise_ids, 'updated_at': updated_at}
@@ -0,0 +1,57 @@
+'''
+Серия дней подряд с занятиями: состояние хранится в user_streaks и обновляется
+одним upsert на каждое завершение урока или упражнения.
+'''
+from typing import Any, Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = 'Europe/Moscow'
+
+# CTE для вставки в WITH запроса завершения. Ожидает параметры %(user_id)s,
+# %(timezone)s (NULL — взять сохранённый пояс) и %(default_timezone)s.
+# streak_previous.current_streak и streak.current_streak дают серию до и после события.
+STREAK_CTES = '''
+    streak_previous AS (
+        SELECT current_streak, timezone FROM user_streaks WHERE user_id = %(user_id)s
+    ), streak_today AS (
+        SELECT (CURRENT_TIMESTAMP AT TIME ZONE COALESCE(
+            %(timezone)s, (SELECT timezone FROM streak_previous), %(default_timezone)s
+        ))::date AS day
+    ), streak AS (
+        INSERT INTO user_streaks (user_id, last_active_date, current_streak, best_streak, timezone)
+        SELECT %(user_id)s, day, 1, 1, COALESCE(%(timezone)s, %(default_timezone)s)
+        FROM streak_today
+        ON CONFLICT (user_id) DO UPDATE
+        SET current_streak = CASE
+                WHEN user_streaks.last_active_date >= EXCLUDED.last_active_date THEN user_streaks.current_streak
+                WHEN user_streaks.last_active_date = EXCLUDED.last_active_date - 1 THEN user_streaks.current_streak + 1
+                ELSE 1
+            END,
+            best_streak = GREATEST(user_streaks.best_streak, CASE
+                WHEN user_streaks.last_active_date >= EXCLUDED.last_active_date THEN user_streaks.current_streak
+                WHEN user_streaks.last_active_date = EXCLUDED.last_active_date - 1 THEN user_streaks.current_streak + 1
+                ELSE 1
+            END),
+            last_active_date = GREATEST(user_streaks.last_active_date, EXCLUDED.last_active_date),
+            timezone = COALESCE(%(timezone)s, user_streaks.timezone),
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING current_streak
+    )
+'''
+
+
+def parse_timezone(value: Optional[str]) -> Optional[str]:
+    '''
+    Часовой пояс клиента (имя IANA) или None, если он не передан или неизвестен
+    '''
+    if not value:
+        return None
+    try:
+        ZoneInfo(value)
+        return value
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def streak_params(user_id: Any, timezone: Optional[str]) -> Dict[str, Any]:
+    return {'user_id': user_id, 'timezone': parse_timezone(timezone), 'default_timezone': DEFAULT_TIMEZONE}
@@ -0,0 +1,230 @@
+'''
+Пакетная синхронизация завершений уроков и упражнений, накопленных клиентом офлайн.
+Пакет применяется в одной транзакции: каждая таблица получает один execute_values
+на весь пакет, а счётчики, XP и достижения обновляются один раз на пользователя.
+Недельный XP и серия дней считаются по completed_at событий, а не по времени синхронизации.
+'''
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from achievements import get_engine
+from streaks import parse_timezone
+
+LESSON_XP = 100
+MAX_SYNC_EVENTS = 500
+
+
+def parse_completed_at(value: Any) -> Optional[datetime]:
+    '''
+    Время завершения из события (ISO 8601) как наивное UTC; без значения — текущее время
+    '''
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if value is None:
+        return now
+    try:
+        completed_at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(completed_at, now)
+
+
+def error(message: str) -> Dict[str, Any]:
+    return {'status': 'error', 'error': message}
+
+
+def is_count(value: Any) -> bool:
+    '''
+    Неотрицательное целое (time_spent, score); bool в JSON — не число
+    '''
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def apply_batch(cur: Any, events: List[Dict[str, Any]], default_user_id: Any, user_timezone: Optional[str]) -> Dict[str, Any]:
+    results: List[Optional[Dict[str, Any]]] = [None] * len(events)
+    lessons: Dict[Tuple[int, int], Tuple[datetime, Optional[int]]] = {}
+    lesson_events: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    exercises: List[Tuple[int, int, int, Any, Any, datetime]] = []
+
+    user_ids = [item.get('user_id', default_user_id) for item in events if isinstance(item, dict)]
+    cur.execute('SELECT id FROM users WHERE id = ANY(%s)', (list({u for u in user_ids if isinstance(u, int)}),))
+    known_users = {row[0] for row in cur.fetchall()}
+
+    for index, item in enumerate(events):
+        if not isinstance(item, dict):
+            results[index] = error('event must be an object')
+            continue
+        user_id = item.get('user_id', default_user_id)
+        completed_at = parse_completed_at(item.get('completed_at'))
+        rating = item.get('rating')
+
+        if not isinstance(user_id, int) or user_id not in known_users:
+            results[index] = error('User not found')
+        elif completed_at is None:
+            results[index] = error('completed_at must be an ISO 8601 timestamp')
+        elif item.get('type') == 'lesson' and isinstance(item.get('lesson_id'), int):
+            if rating is not None and (not isinstance(rating, int) or not 1 <= rating <= 5):
+                results[index] = error('rating must be between 1 and 5')
+                continue
+            key = (user_id, item['lesson_id'])
+            lessons[key] = (completed_at, rating)
+            lesson_events[key].append(index)
+        elif item.get('type') == 'exercise' and isinstance(item.get('exercise_id'), int):
+            time_spent, score = item.get('time_spent'), item.get('score', 100)
+            if (time_spent is not None and not is_count(time_spent)) or not is_count(score):
+                results[index] = error('time_spent and score must be non-negative integers')
+                continue
+            exercises.append((index, user_id, item['exercise_id'], time_spent, score, completed_at))
+        else:
+            results[index] = error('type must be lesson (with lesson_id) or exercise (with exercise_id)')
+
+    totals: Dict[int, Dict[str, Any]] = defaultdict(
+        lambda: {'xp': 0, 'lessons': 0, 'lesson_ids': [], 'exercises': 0, 'distinct_exercises': 0}
+    )
+    # (user_id, completed_at, xp) каждого применённого события — для недельного XP
+    xp_events: List[Tuple[int, datetime, int]] = []
+
+    if lessons:
+        cur.execute('SELECT id FROM lessons WHERE id = ANY(%s)', (list({key[1] for key in lessons}),))
+        known_lessons = {row[0] for row in cur.fetchall()}
+        for key in [key for key in lessons if key[1] not in known_lessons]:
+            del lessons[key]
+            for index in lesson_events.pop(key):
+                results[index] = error('Lesson not found')
+
+    if lessons:
+        keys = list(lessons)
+        already_completed = set(execute_values(cur, '''
+            SELECT up.user_id, up.lesson_id
+            FROM user_progress up
+            JOIN (VALUES %s) AS batch (user_id, lesson_id)
+            ON up.user_id = batch.user_id AND up.lesson_id = batch.lesson_id
+            WHERE up.completed = true
+        ''', keys, page_size=MAX_SYNC_EVENTS, fetch=True))
+        rows = execute_values(cur, '''
+            INSERT INTO user_progress (user_id, lesson_id, completed, completed_at, rating)
+            VALUES %s
+            ON CONFLICT (user_id, lesson_id)
+            DO UPDATE SET completed = true, completed_at = EXCLUDED.completed_at, rating = EXCLUDED.rating
+            RETURNING user_id, lesson_id, id
+        ''', [(user_id, lesson_id, True, *lessons[(user_id, lesson_id)]) for user_id, lesson_id in keys],
+            page_size=MAX_SYNC_EVENTS, fetch=True)
+        progress_ids = {(row[0], row[1]): row[2] for row in rows}
+
+        for key in keys:
+            user_id, lesson_id = key
+            for index in lesson_events[key]:
+                results[index] = {'status': 'ok', 'id': progress_ids[key], 'xp_earned': LESSON_XP}
+                totals[user_id]['xp'] += LESSON_XP
+                xp_events.append((user_id, lessons[key][0], LESSON_XP))
+            if key not in already_completed:
+                totals[user_id]['lessons'] += 1
+                totals[user_id]['lesson_ids'].append(lesson_id)
+
+    if exercises:
+        cur.execute('SELECT id, points FROM exercises WHERE id = ANY(%s)', (list({e[2] for e in exercises}),))
+        points = dict(cur.fetchall())
+        valid = []
+        for exercise in exercises:
+            if exercise[2] in points:
+                valid.append(exercise)
+            else:
+                results[exercise[0]] = error('Exercise not found')
+
+        if valid:
+            done = set(execute_values(cur, '''
+                SELECT DISTINCT ue.user_id, ue.exercise_id
+                FROM user_exercises ue
+                JOIN (VALUES %s) AS batch (user_id, exercise_id)
+                ON ue.user_id = batch.user_id AND ue.exercise_id = batch.exercise_id
+            ''', list({(e[1], e[2]) for e in valid}), page_size=MAX_SYNC_EVENTS, fetch=True))
+            # Порядок строк RETURNING не гарантирован, поэтому id выделяются заранее
+            # и сопоставляются с событиями по их номеру в пакете
+            rows = execute_values(cur, '''
+                WITH batch AS (
+                    SELECT b.ordinal, nextval(pg_get_serial_sequence('user_exercises', 'id')) AS id,
+                           b.user_id, b.exercise_id, b.time_spent::integer AS time_spent,
+                           b.score::integer AS score, b.completed_at::timestamp AS completed_at
+                    FROM (VALUES %s) AS b (ordinal, user_id, exercise_id, time_spent, score, completed_at)
+                ), inserted AS (
+                    INSERT INTO user_exercises (id, user_id, exercise_id, time_spent, score, completed_at)
+                    SELECT id, user_id, exercise_id, time_spent, score, completed_at FROM batch
+                )
+                SELECT ordinal, id FROM batch
+            ''', valid, page_size=MAX_SYNC_EVENTS, fetch=True)
+            completion_ids = dict(rows)
+
+            for index, user_id, exercise_id, _, _, completed_at in valid:
+                completion_id = completion_ids[index]
+                results[index] = {'status': 'ok', 'id': completion_id, 'xp_earned': points[exercise_id]}
+                totals[user_id]['xp'] += points[exercise_id]
+                xp_events.append((user_id, completed_at, points[exercise_id]))
+                totals[user_id]['exercises'] += 1
+                if (user_id, exercise_id) not in done:
+                    done.add((user_id, exercise_id))
+                    totals[user_id]['distinct_exercises'] += 1
+
+    users: List[Dict[str, Any]] = []
+    if not totals:
+        return {'results': results, 'users': users}
+
+    total_xp = dict(execute_values(cur, '''
+        UPDATE users SET total_xp = users.total_xp + batch.xp
+        FROM (VALUES %s) AS batch (user_id, xp)
+        WHERE users.id = batch.user_id
+        RETURNING users.id, users.total_xp
+    ''', [(user_id, t['xp']) for user_id, t in totals.items()], page_size=MAX_SYNC_EVENTS, fetch=True))
+    stats = {row[0]: row[1:] for row in execute_values(cur, '''
+        INSERT INTO user_stats (user_id, completed_lessons, completed_exercises, exercise_completions)
+        VALUES %s
+        ON CONFLICT (user_id) DO UPDATE
+        SET completed_lessons = user_stats.completed_lessons + EXCLUDED.completed_lessons,
+            completed_exercises = user_stats.completed_exercises + EXCLUDED.completed_exercises,
+            exercise_completions = user_stats.exercise_completions + EXCLUDED.exercise_completions,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING user_id, completed_lessons, exercise_completions
+    ''', [
+        (user_id, t['lessons'], t['distinct_exercises'], t['exercises']) for user_id, t in totals.items()
+    ], page_size=MAX_SYNC_EVENTS, fetch=True)}
+    # Неделя каждого события считается так же, как leaderboard_week_start(): с понедельника по Москве
+    execute_values(cur, '''
+        INSERT INTO user_xp_weekly (week_start, user_id, xp)
+        SELECT date_trunc('week', batch.completed_at AT TIME ZONE 'UTC' AT TIME ZONE 'Europe/Moscow')::date,
+               batch.user_id, SUM(batch.xp)
+        FROM (VALUES %s) AS batch (user_id, completed_at, xp)
+        GROUP BY 1, 2
+        ON CONFLICT (week_start, user_id) DO UPDATE
+        SET xp = user_xp_weekly.xp + EXCLUDED.xp
+    ''', xp_events, page_size=MAX_SYNC_EVENTS)
+
+    # Серия пересчитывается по истории пользователя, чтобы офлайн-дни легли каждый на свой день
+    user_ids = list(totals)
+    cur.execute(
+        'SELECT streak_user_id, streak_current FROM refresh_user_streaks(%s::integer[], %s)',
+        (user_ids, parse_timezone(user_timezone))
+    )
+    streaks = dict(cur.fetchall())
+
+    engine = get_engine(cur)
+    for user_id, t in totals.items():
+        streak = streaks.get(user_id, 0)
+        completed_lessons, exercise_completions = stats[user_id]
+
+        candidates = engine.reached('lessons_completed', completed_lessons)
+        candidates += engine.reached('exercises_completed', exercise_completions)
+        candidates += engine.reached('daily_streak', streak)
+        for lesson_id in t['lesson_ids']:
+            candidates += engine.matched('specific_lesson', lesson_id)
+
+        users.append({
+            'user_id': user_id,
+            'total_xp': total_xp.get(user_id),
+            'streak': streak,
+            'new_achievements': engine.award(cur, user_id, candidates)
+        })
+
+    return {'results': results, 'users': users}
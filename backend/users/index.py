@@ -1,139 +1,108 @@
-import json
-import os
-import psycopg2
 from typing import Dict, Any
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+from leaderboard import LEADERBOARD_MAX_AROUND, LEADERBOARD_MAX_LIMIT, WINDOWS, build_leaderboard
+from rows import USER_ROW, USER_SQL
+from runtime import Request, Router, RowMapper, connection, error, respond
+
+RECONCILE_BATCH_SIZE = 1000
+
+NEW_USER_ROW = RowMapper(('id', 'username', 'email', 'level', 'total_xp'))
+
+
+def reconcile_stats(conn: Any) -> int:
     '''
-    API для работы с пользователями
-    POST / - создать нового пользователя
-    GET /?id=1 - получить данные пользователя
+    Пересчитывает user_stats по истории пачками пользователей, по транзакции на пачку
     '''
-    method: str = event.get('httpMethod', 'GET')
+    cur = conn.cursor()
+    last_user_id = 0
+    batches = 0
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    while last_user_id is not None:
+        cur.execute('SELECT reconcile_user_stats(%s, %s)', (last_user_id, RECONCILE_BATCH_SIZE))
+        last_user_id = cur.fetchone()[0]
+        conn.commit()
+        batches += 1
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cur = conn.cursor()
+    cur.close()
+    return batches - 1
+
+
+router = Router()
+
+
+@router.post('reconcile-stats', worker=True)
+def reconcile_stats_route(request: Request) -> Dict[str, Any]:
+    with connection() as conn:
+        batches = reconcile_stats(conn)
+    return respond(200, {'batches': batches})
+
+
+@router.post()
+def create_user(request: Request) -> Dict[str, Any]:
+    username = request.body.get('username')
+    email = request.body.get('email')
+    
+    if not username or not email:
+        return error(400, 'username and email required')
     
-    if method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        username = body_data.get('username')
-        email = body_data.get('email')
-        
-        if not username or not email:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'username and email required'}),
-                'isBase64Encoded': False
-            }
-        
+    with connection() as conn, conn.cursor() as cur:
         cur.execute('''
             INSERT INTO users (username, email)
             VALUES (%s, %s)
             RETURNING id, username, email, level, total_xp
         ''', (username, email))
-        
         row = cur.fetchone()
         conn.commit()
-        
-        user = {
-            'id': row[0],
-            'username': row[1],
-            'email': row[2],
-            'level': row[3],
-            'total_xp': row[4]
-        }
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 201,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(user, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
     
-    if method == 'GET':
-        params = event.get('queryStringParameters', {}) or {}
-        user_id = params.get('id')
-        
-        if not user_id:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 400,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'id required'}),
-                'isBase64Encoded': False
-            }
-        
-        cur.execute('''
-            SELECT u.id, u.username, u.email, u.level, u.total_xp, u.avatar_url,
-                   COUNT(DISTINCT up.lesson_id) as completed_lessons,
-                   COUNT(DISTINCT ue.exercise_id) as completed_exercises
-            FROM users u
-            LEFT JOIN user_progress up ON u.id = up.user_id AND up.completed = true
-            LEFT JOIN user_exercises ue ON u.id = ue.user_id
-            WHERE u.id = %s
-            GROUP BY u.id
-        ''', (user_id,))
-        
+    return respond(201, NEW_USER_ROW(row))
+
+
+@router.get('leaderboard')
+def get_leaderboard(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('id')
+    window = request.params.get('window', 'all')
+    limit = request.params.get('limit', '10')
+    around = request.params.get('around', '5')
+    
+    if window not in WINDOWS or not limit.isdigit() or not around.isdigit() or (user_id and not user_id.isdigit()):
+        return error(400, f'window must be one of {", ".join(WINDOWS)}; limit, around and id must be integers')
+    
+    with connection() as conn, conn.cursor() as cur:
+        leaderboard = build_leaderboard(
+            cur,
+            window,
+            min(int(limit), LEADERBOARD_MAX_LIMIT),
+            int(user_id) if user_id else None,
+            min(int(around), LEADERBOARD_MAX_AROUND)
+        )
+    
+    return respond(200, leaderboard)
+
+
+@router.get()
+def get_user(request: Request) -> Dict[str, Any]:
+    user_id = request.params.get('id')
+    
+    if not user_id:
+        return error(400, 'id required')
+    
+    with connection() as conn, conn.cursor() as cur:
+        cur.execute(USER_SQL, (user_id,))
         row = cur.fetchone()
-        
-        if not row:
-            cur.close()
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'User not found'}),
-                'isBase64Encoded': False
-            }
-        
-        user = {
-            'id': row[0],
-            'username': row[1],
-            'email': row[2],
-            'level': row[3],
-            'total_xp': row[4],
-            'avatar_url': row[5],
-            'completed_lessons': row[6],
-            'completed_exercises': row[7]
-        }
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-            'body': json.dumps(user, ensure_ascii=False),
-            'isBase64Encoded': False
-        }
     
-    cur.close()
-    conn.close()
+    if not row:
+        return error(404, 'User not found')
     
-    return {
-        'statusCode': 405,
-        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-        'body': json.dumps({'error': 'Method not allowed'}),
-        'isBase64Encoded': False
-    }
+    return respond(200, USER_ROW(row))
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    API для работы с пользователями
+    POST / - создать нового пользователя
+    POST /?action=reconcile-stats - пересчитать счётчики user_stats по истории (по расписанию, X-Worker-Token)
+    GET /?id=1 - получить данные пользователя
+    GET /?action=leaderboard&window=all|week&limit=10 - таблица лидеров по XP
+    GET /?action=leaderboard&id=1&around=5 - то же плюс место пользователя и соседи по таблице
+    '''
+    return router.dispatch(event)
@@ -0,0 +1,141 @@
+'''
+Таблица лидеров по XP за всё время и за текущую неделю.
+Все чтения идут по индексам (total_xp DESC, id) и (week_start, xp DESC, user_id):
+топ — первые limit записей индекса, место пользователя — COUNT(*) по диапазону выше его XP,
+соседи — по limit записей индекса в обе стороны от него. XP пишут функции progress и exercises,
+поэтому таблица всегда отражает последние завершения, без кэша в контейнере.
+'''
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_MAX_AROUND = 25
+
+
+class Window(NamedTuple):
+    table: str
+    xp: str
+    user_id: str
+    condition: str
+
+
+WINDOWS = {
+    'all': Window('users', 'total_xp', 'id', 'total_xp > 0'),
+    'week': Window('user_xp_weekly', 'xp', 'user_id', 'week_start = leaderboard_week_start() AND xp > 0'),
+}
+
+
+def top_sql(window: Window) -> str:
+    return f'''
+        SELECT {window.user_id}, {window.xp} FROM {window.table}
+        WHERE {window.condition}
+        ORDER BY {window.xp} DESC, {window.user_id}
+        LIMIT %s
+    '''
+
+
+def position_sql(window: Window) -> str:
+    '''
+    Текущий XP пользователя (0, если записи нет) и его место: выше стоят те, у кого XP больше,
+    и при равном XP — те, кто раньше зарегистрировался. Оба счётчика — диапазоны индекса
+    '''
+    return f'''
+        WITH me AS (
+            SELECT COALESCE((
+                SELECT {window.xp} FROM {window.table}
+                WHERE {window.condition} AND {window.user_id} = %(user_id)s
+            ), 0) AS xp
+        )
+        SELECT me.xp,
+               1 + (SELECT COUNT(*) FROM {window.table} WHERE {window.condition} AND {window.xp} > me.xp)
+                 + (SELECT COUNT(*) FROM {window.table}
+                    WHERE {window.condition} AND {window.xp} = me.xp AND {window.user_id} < %(user_id)s)
+        FROM me
+    '''
+
+
+def neighbors_sql(window: Window) -> str:
+    '''
+    До %(around)s записей непосредственно выше (side = -1, от ближайшей) и ниже (side = 1) пользователя;
+    каждая ветка — упорядоченный диапазон индекса с LIMIT
+    '''
+    columns = f'{window.user_id}, {window.xp}'
+    return f'''
+        (SELECT -1, {columns} FROM {window.table}
+         WHERE {window.condition} AND {window.xp} = %(xp)s AND {window.user_id} < %(user_id)s
+         ORDER BY {window.user_id} DESC LIMIT %(around)s)
+        UNION ALL
+        (SELECT -1, {columns} FROM {window.table}
+         WHERE {window.condition} AND {window.xp} > %(xp)s
+         ORDER BY {window.xp}, {window.user_id} DESC LIMIT %(around)s)
+        UNION ALL
+        (SELECT 1, {columns} FROM {window.table}
+         WHERE {window.condition} AND {window.xp} = %(xp)s AND {window.user_id} > %(user_id)s
+         ORDER BY {window.user_id} LIMIT %(around)s)
+        UNION ALL
+        (SELECT 1, {columns} FROM {window.table}
+         WHERE {window.condition} AND {window.xp} < %(xp)s
+         ORDER BY {window.xp} DESC, {window.user_id} LIMIT %(around)s)
+    '''
+
+
+TOP_SQL = {name: top_sql(window) for name, window in WINDOWS.items()}
+POSITION_SQL = {name: position_sql(window) for name, window in WINDOWS.items()}
+NEIGHBORS_SQL = {name: neighbors_sql(window) for name, window in WINDOWS.items()}
+
+
+def load_users(cur: Any, user_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+    if not user_ids:
+        return {}
+    cur.execute('SELECT id, username, level FROM users WHERE id = ANY(%s)', (list(user_ids),))
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+
+def load_neighbors(cur: Any, window: str, user_id: int, xp: int, rank: int, around: int) -> List[Tuple[int, int, int]]:
+    '''
+    (место, user_id, xp) соседей сверху вниз; записи каждой стороны упорядочиваются по удалению от пользователя
+    '''
+    if not around:
+        return []
+    cur.execute(NEIGHBORS_SQL[window], {'user_id': user_id, 'xp': xp, 'around': around})
+    rows = cur.fetchall()
+    above = sorted(
+        ((entry_user_id, entry_xp) for side, entry_user_id, entry_xp in rows if side < 0),
+        key=lambda entry: (entry[1], -entry[0])
+    )[:around]
+    below = sorted(
+        ((entry_user_id, entry_xp) for side, entry_user_id, entry_xp in rows if side > 0),
+        key=lambda entry: (-entry[1], entry[0])
+    )[:around]
+    return [
+        (rank - 1 - offset, entry_user_id, entry_xp)
+        for offset, (entry_user_id, entry_xp) in reversed(list(enumerate(above)))
+    ] + [
+        (rank + 1 + offset, entry_user_id, entry_xp)
+        for offset, (entry_user_id, entry_xp) in enumerate(below)
+    ]
+
+
+def build_leaderboard(cur: Any, window: str, limit: int, user_id: Optional[int], around: int) -> Dict[str, Any]:
+    cur.execute(TOP_SQL[window], (limit,))
+    top = [(rank, entry_user_id, xp) for rank, (entry_user_id, xp) in enumerate(cur.fetchall(), start=1)]
+    neighbors: List[Tuple[int, int, int]] = []
+    me: Optional[Dict[str, Any]] = None
+
+    if user_id is not None:
+        cur.execute(POSITION_SQL[window], {'user_id': user_id})
+        xp, rank = cur.fetchone()
+        neighbors = load_neighbors(cur, window, user_id, xp, rank, around)
+        me = {'rank': rank, 'xp': xp}
+
+    users = load_users(cur, list({entry_user_id for _, entry_user_id, _ in top + neighbors}))
+
+    def describe(entries: List[Tuple[int, int, int]]) -> List[Dict[str, Any]]:
+        return [
+            {'rank': rank, 'id': entry_user_id, 'username': users[entry_user_id][0], 'level': users[entry_user_id][1], 'xp': xp}
+            for rank, entry_user_id, xp in entries
+            if entry_user_id in users
+        ]
+
+    if me is not None:
+        me['neighbors'] = describe(neighbors)
+    return {'window': window, 'top': describe(top), 'me': me}
@@ -0,0 +1,172 @@
+'''
+Учёт SQL-запросов в пределах одного вызова функции: число запросов, время каждого,
+число строк и время подключения к БД. Курсор InstrumentedCursor подключается в db.py,
+итог вызова runtime отдаёт в Server-Timing и пишет одной JSON-строкой в stdout.
+Медленные запросы с вероятностью SLOW_QUERY_SAMPLE_RATE логируются вместе с планом EXPLAIN.
+В журнал попадает только текст запроса с плейсхолдерами: значения параметров (email, тексты
+комментариев, изображения в base64) не логируются.
+'''
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+from serializer import dumps
+
+QUERY_LOG = os.environ.get('QUERY_LOG', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_SAMPLE_RATE', '0.1'))
+MAX_LOGGED_STATEMENTS = 20
+MAX_QUERY_TEXT = 2000
+# EXPLAIN заново отправляет параметры, поэтому запросы с большими значениями не объясняются
+MAX_EXPLAIN_BYTES = 64 * 1024
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+
+
+class RequestStats:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.db_ms = 0.0
+        self.rows = 0
+        self.connects = 0
+        self.connect_ms = 0.0
+        self.timings: List[Dict[str, Any]] = []
+        self.slow: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_statement(self, query: str, elapsed_ms: float, rows: int) -> None:
+        with self._lock:
+            self.statements += 1
+            self.db_ms += elapsed_ms
+            self.rows += max(rows, 0)
+            if len(self.timings) < MAX_LOGGED_STATEMENTS:
+                self.timings.append({'ms': round(elapsed_ms, 2), 'rows': rows, 'sql': ' '.join(query[:240].split())[:120]})
+
+    def record_connect(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self.connects += 1
+            self.connect_ms += elapsed_ms
+
+    def server_timing(self) -> str:
+        timing = f'db;dur={self.db_ms:.2f};desc="{self.statements} queries, {self.rows} rows"'
+        if self.connects:
+            timing += f', connect;dur={self.connect_ms:.2f}'
+        return timing
+
+
+# Функция обрабатывает один вызов за раз; потоки внутри вызова пишут в тот же объект
+_current: Optional[RequestStats] = None
+
+
+def begin() -> RequestStats:
+    global _current
+    _current = RequestStats()
+    return _current
+
+
+def end() -> Optional[RequestStats]:
+    global _current
+    stats, _current = _current, None
+    return stats
+
+
+def record_connect(elapsed_ms: float) -> None:
+    if _current is not None:
+        _current.record_connect(elapsed_ms)
+
+
+def explain(conn: Any, query: str, vars: Any = None) -> Optional[str]:
+    '''
+    План запроса без выполнения; отдельный курсор не учитывается и не трогает результат исходного.
+    query — текст с плейсхолдерами, vars — те же параметры, что у исходного execute.
+    EXPLAIN идёт под точкой сохранения: его ошибка откатывается к ней и не прерывает транзакцию вызова
+    '''
+    if not query.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+    if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+        return None
+    guarded = not conn.autocommit
+    cur = psycopg2.extensions.cursor(conn)
+    try:
+        if guarded:
+            cur.execute('SAVEPOINT querylog_explain')
+        try:
+            cur.execute('EXPLAIN ' + query, vars)
+            plan = '\n'.join(row[0] for row in cur.fetchall())
+        except psycopg2.Error as error:
+            if guarded:
+                cur.execute('ROLLBACK TO SAVEPOINT querylog_explain')
+                cur.execute('RELEASE SAVEPOINT querylog_explain')
+            return f'EXPLAIN failed: {error}'
+        if guarded:
+            cur.execute('RELEASE SAVEPOINT querylog_explain')
+        return plan
+    except psycopg2.Error as error:
+        return f'EXPLAIN failed: {error}'
+    finally:
+        cur.close()
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    '''
+    Учитывает запрос по тексту, переданному в execute, а не по self.query, в который уже подставлены значения
+    '''
+
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(started, query, vars)
+
+    def executemany(self, query: Any, vars_list: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(started, query, None, explainable=False)
+
+    def _record(self, started: float, query: Any, vars: Any, explainable: bool = True) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = _current
+        if stats is None:
+            return
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        elif not isinstance(query, str):
+            query = query.as_string(self)
+        stats.record_statement(query, elapsed_ms, self.rowcount)
+        if elapsed_ms >= SLOW_QUERY_MS and random.random() < SLOW_QUERY_SAMPLE_RATE:
+            explained = explainable and len(self.query or b'') <= MAX_EXPLAIN_BYTES
+            stats.slow.append({
+                'ms': round(elapsed_ms, 2),
+                'sql': query[:MAX_QUERY_TEXT],
+                'plan': explain(self.connection, query, vars) if explained else None
+            })
+
+
+def emit(stats: RequestStats, route: str, status: int, app_ms: float) -> None:
+    '''
+    Одна строка JSON на вызов, медленные запросы с планами — в поле slow
+    '''
+    if not QUERY_LOG:
+        return
+    record: Dict[str, Any] = {
+        'type': 'request',
+        'route': route,
+        'status': status,
+        'app_ms': round(app_ms, 2),
+        'db_ms': round(stats.db_ms, 2),
+        'statements': stats.statements,
+        'rows': stats.rows,
+        'connects': stats.connects,
+        'connect_ms': round(stats.connect_ms, 2),
+        'timings': stats.timings,
+    }
+    if stats.slow:
+        record['slow'] = stats.slow
+    print(dumps(record), flush=True)
@@ -0,0 +1,163 @@
+'''
+Холодный старт функций: каждая функция импортируется в новом процессе интерпретатора,
+как при первом вызове в облаке. Для каждой измеряются время импорта index.py,
+время первого вызова handler (с подключением к БД и ленивой инициализацией) и второго,
+уже тёплого, а также самые тяжёлые пакеты по данным python -X importtime.
+Без --dsn измеряется только импорт. С --check результат сравнивается с baseline.json.
+
+    python -m bench.coldstart
+    python -m bench.coldstart --dsn postgresql://localhost/bench --check
+'''
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from bench.run import BASELINE_PATH, DEFAULT_TOLERANCE
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+FUNCTIONS = ('lessons', 'exercises', 'progress', 'users', 'gallery', 'bootstrap')
+IMPORT_MARKER = 'bench.coldstart: import index'
+TOP_PACKAGES = 5
+
+# Выполняется в чистом процессе: до импорта index загружается только необходимый минимум stdlib
+CHILD = '''
+import json, sys, time
+function_dir, event = sys.argv[1], json.loads(sys.argv[2])
+sys.path.insert(0, function_dir)
+print(%r, file=sys.stderr, flush=True)
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+result = {'import_ms': (imported - started) * 1000}
+if event is not None:
+    index.handler(event, None)
+    first = time.perf_counter()
+    index.handler(event, None)
+    result['first_call_ms'] = (first - imported) * 1000
+    result['warm_call_ms'] = (time.perf_counter() - first) * 1000
+print(json.dumps(result))
+''' % IMPORT_MARKER
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    '''
+    Собственное время импорта (self, мкс), просуммированное по пакету верхнего уровня,
+    только для модулей, загруженных после маркера — то есть самим index.py
+    '''
+    packages: Dict[str, float] = {}
+    lines = stderr.splitlines()
+    if IMPORT_MARKER in lines:
+        lines = lines[lines.index(IMPORT_MARKER) + 1:]
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|', 2)
+        package = name.strip().split('.', 1)[0]
+        packages[package] = packages.get(package, 0.0) + int(self_us) / 1000
+    return packages
+
+
+def run_once(function: str, event: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD, str(BACKEND_DIR / function), json.dumps(event)],
+        capture_output=True, text=True, env=os.environ.copy()
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'{function}: cold start failed\n{completed.stderr[-2000:]}')
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['packages'] = parse_importtime(completed.stderr)
+    return result
+
+
+def first_event(function: str, volumes: Dict[str, int], seed: int) -> Dict[str, Any]:
+    from bench.scenarios import SCENARIOS
+
+    scenario = next(scenario for scenario in SCENARIOS if scenario.function == function)
+    return scenario.make_event(random.Random(seed), volumes)
+
+
+def measure(function: str, event: Optional[Dict[str, Any]], runs: int) -> Dict[str, Any]:
+    samples = [run_once(function, event) for _ in range(runs)]
+    result: Dict[str, Any] = {}
+    for metric in ('import_ms', 'first_call_ms', 'warm_call_ms'):
+        if metric in samples[0]:
+            result[metric] = round(statistics.median(sample[metric] for sample in samples), 2)
+    packages: Dict[str, List[float]] = {}
+    for sample in samples:
+        for package, ms in sample['packages'].items():
+            packages.setdefault(package, []).append(ms)
+    heaviest = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:TOP_PACKAGES]
+    result['top_imports'] = {package: round(statistics.median(ms), 1) for package, ms in heaviest}
+    return result
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ('import_ms', 'first_call_ms'):
+            if metric in result and base.get(metric) and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {result[metric]} > {base[metric]} baseline')
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'function':22} {'import':>9} {'1st call':>9} {'warm':>9}  heaviest imports, ms")
+    for name, r in results.items():
+        imports = ', '.join(f'{package} {ms}' for package, ms in r['top_imports'].items())
+        print(f"{name:22} {r['import_ms']:9.1f} {r.get('first_call_ms', 0):9.1f} {r.get('warm_call_ms', 0):9.1f}  {imports}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Время холодного старта каждой функции')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='база для первого вызова; без неё — только импорт')
+    parser.add_argument('--runs', type=int, default=5, help='новых процессов на функцию, берётся медиана')
+    parser.add_argument('--only', help='имя функции')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help='сравнить с baseline.json и упасть при регрессии')
+    parser.add_argument('--update-baseline', action='store_true', help='записать результаты в baseline.json')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='допустимый рост времени старта, доля')
+    args = parser.parse_args(argv)
+
+    from bench.run import configure_environment, load_volumes
+
+    configure_environment(args.dsn or 'postgresql://localhost/bench')
+    volumes = load_volumes(args.dsn) if args.dsn else None
+
+    results = {}
+    for function in FUNCTIONS:
+        if args.only and args.only != function:
+            continue
+        event = first_event(function, volumes, args.seed) if volumes else None
+        results[f'coldstart.{function}'] = measure(function, event, args.runs)
+
+    print_table(results)
+
+    if args.update_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text(encoding='utf-8')) if BASELINE_PATH.exists() else {}
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f'baseline written to {BASELINE_PATH}')
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print('no baseline.json yet; run with --update-baseline first', file=sys.stderr)
+            return 1
+        regressions = find_regressions(results, json.loads(BASELINE_PATH.read_text(encoding='utf-8')), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
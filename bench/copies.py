@@ -0,0 +1,62 @@
+'''
+Проверка копий общих модулей. Каждая функция из backend/ деплоится отдельно и видит
+только файлы своего каталога, поэтому общие модули (db.py, runtime.py, querylog.py,
+serializer.py, cache.py, streaks.py, achievements.py и другие) лежат копией в каждой
+функции, которой они нужны. Правка вносится во все копии сразу; проверка сравнивает
+одноимённые модули разных функций и завершается с кодом 1, если копии разошлись.
+
+    python -m bench.copies
+'''
+import argparse
+import hashlib
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+# Точка входа у каждой функции своя
+OWN_MODULES = ('index.py',)
+
+
+def collect(backend_dir: Path) -> Dict[str, Dict[str, str]]:
+    '''
+    Имя модуля -> {функция: sha256} для модулей, лежащих более чем в одной функции
+    '''
+    copies: Dict[str, Dict[str, str]] = {}
+    for path in sorted(backend_dir.glob('*/*.py')):
+        if path.name in OWN_MODULES:
+            continue
+        copies.setdefault(path.name, {})[path.parent.name] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return {name: hashes for name, hashes in copies.items() if len(hashes) > 1}
+
+
+def find_divergent(copies: Dict[str, Dict[str, str]]) -> List[str]:
+    divergent = []
+    for name, hashes in copies.items():
+        if len(set(hashes.values())) == 1:
+            continue
+        groups: Dict[str, List[str]] = {}
+        for function, digest in hashes.items():
+            groups.setdefault(digest, []).append(function)
+        variants = '; '.join(', '.join(functions) for functions in sorted(groups.values(), key=len, reverse=True))
+        divergent.append(f'{name}: {len(groups)} variants ({variants})')
+    return divergent
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Проверка, что копии общих модулей в функциях совпадают')
+    parser.add_argument('--backend', type=Path, default=BACKEND_DIR, help='каталог с функциями')
+    args = parser.parse_args(argv)
+
+    copies = collect(args.backend)
+    for name, hashes in copies.items():
+        print(f"{name:22} {', '.join(hashes)}")
+
+    divergent = find_divergent(copies)
+    for item in divergent:
+        print(f'DIVERGED {item}', file=sys.stderr)
+    return 1 if divergent else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
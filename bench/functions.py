@@ -0,0 +1,91 @@
+'''
+Загрузка функций из backend/ в один процесс. У каждой функции свои копии db.py, runtime.py
+и других модулей с одинаковыми именами, поэтому перед импортом очередной функции
+её модули выгружаются из sys.modules, а каждая функция получает собственные экземпляры.
+Все соединения создаются с курсором, считающим выполненные запросы.
+'''
+import importlib
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+FUNCTIONS = ('lessons', 'exercises', 'progress', 'users', 'gallery', 'bootstrap')
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.queries = 0
+        self.connects = 0
+        # Список для сбора текстов запросов (bench.plans); None — не собирать
+        self.captured: Optional[List[bytes]] = None
+
+
+counter = QueryCounter()
+
+
+_counting_factories: Dict[type, type] = {}
+
+
+def counting_factory(base: type) -> type:
+    '''
+    Подкласс курсора функции (InstrumentedCursor из querylog.py), считающий запросы
+    '''
+    factory = _counting_factories.get(base)
+    if factory is None:
+        class CountingCursor(base):
+            def execute(self, query: Any, vars: Any = None) -> Any:
+                counter.queries += 1
+                result = super().execute(query, vars)
+                if counter.captured is not None:
+                    counter.captured.append(self.query)
+                return result
+
+            def executemany(self, query: Any, vars_list: Any) -> Any:
+                counter.queries += 1
+                return super().executemany(query, vars_list)
+
+        factory = _counting_factories[base] = CountingCursor
+    return factory
+
+
+_connect = psycopg2.connect
+
+
+def counting_connect(*args: Any, **kwargs: Any) -> Any:
+    counter.connects += 1
+    kwargs['cursor_factory'] = counting_factory(kwargs.get('cursor_factory') or psycopg2.extensions.cursor)
+    return _connect(*args, **kwargs)
+
+
+psycopg2.connect = counting_connect
+
+
+def module_names(function_dir: Path) -> set:
+    return {path.stem for path in function_dir.glob('*.py')}
+
+
+def load_handler(name: str) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''
+    Импортирует backend/<name>/index.py со всеми модулями функции и возвращает handler
+    '''
+    function_dir = BACKEND_DIR / name
+    local_modules = set()
+    for other in FUNCTIONS:
+        local_modules |= module_names(BACKEND_DIR / other)
+    for module in local_modules:
+        sys.modules.pop(module, None)
+
+    sys.path.insert(0, str(function_dir))
+    try:
+        index = importlib.import_module('index')
+    finally:
+        sys.path.remove(str(function_dir))
+    return index.handler
+
+
+def load_handlers() -> Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]]:
+    return {name: load_handler(name) for name in FUNCTIONS}
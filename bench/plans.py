@@ -0,0 +1,176 @@
+'''
+Проверка планов запросов: прогоняет все сценарии бенчмарка через обработчики,
+собирает каждый выполненный SQL-запрос и запускает для него EXPLAIN (FORMAT JSON).
+EXPLAIN вызова SQL-функции показывает только узел Result, поэтому тела функций
+на языке sql, которые вызывают запросы (в том числе через другие функции), объясняются
+отдельно: как подготовленный запрос с параметрами $1..$n и общим (generic) планом.
+Прогон завершается с кодом 1, если хоть один план читает большую таблицу
+последовательным сканированием (Seq Scan) с оценкой больше MIN_SEQ_SCAN_ROWS строк.
+Запускается на базе, заполненной bench.seed (достаточно --scale 0.1).
+
+    python -m bench.plans --dsn postgresql://localhost/bench
+'''
+import argparse
+import os
+import random
+import re
+import sys
+from contextlib import ExitStack
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+BIG_TABLES = {
+    'users', 'user_progress', 'user_exercises', 'user_achievements', 'user_stats', 'user_streaks',
+    'user_xp_weekly', 'gallery', 'gallery_likes', 'gallery_comments',
+}
+MIN_SEQ_SCAN_ROWS = 1000
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+
+
+class Statement(NamedTuple):
+    label: str
+    sql: str
+    # Типы параметров $1..$n тела функции; пусто — обычный запрос обработчика
+    arg_types: Tuple[str, ...] = ()
+
+def walk(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def seq_scans(plan: Dict[str, Any]) -> List[Tuple[str, float]]:
+    return [
+        (node['Relation Name'], node.get('Plan Rows', 0))
+        for node in walk(plan)
+        if node.get('Node Type') == 'Seq Scan'
+        and node.get('Relation Name') in BIG_TABLES
+        and node.get('Plan Rows', 0) >= MIN_SEQ_SCAN_ROWS
+    ]
+
+
+def normalize(query: str) -> str:
+    return ' '.join(query.split())
+
+
+def capture_queries(iterations: int, seed: int) -> List[str]:
+    from bench.functions import counter, load_handlers
+    from bench.scenarios import SCENARIOS
+    from bench.run import load_volumes
+
+    handlers = load_handlers()
+    volumes = load_volumes(os.environ['DATABASE_URL'])
+    rng = random.Random(seed)
+
+    counter.captured = []
+    for scenario in SCENARIOS:
+        for _ in range(iterations):
+            handlers[scenario.function](scenario.make_event(rng, volumes), None)
+    captured, counter.captured = counter.captured, None
+
+    unique: Dict[str, str] = {}
+    for query in captured:
+        text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        unique.setdefault(normalize(text), text)
+    return list(unique.values())
+
+
+def function_statements(cur: Any, queries: List[str]) -> List[Statement]:
+    '''
+    Тела функций LANGUAGE sql схемы public, вызываемых запросами напрямую или из других функций
+    (в теле plpgsql ищутся только вызовы). Имена аргументов в теле заменяются на $1..$n
+    '''
+    cur.execute('''
+        SELECT p.proname, l.lanname, p.prosrc, COALESCE(p.proargnames, '{}'), p.proargtypes::regtype[]::text[]
+        FROM pg_proc p
+        JOIN pg_namespace n ON n.oid = p.pronamespace
+        JOIN pg_language l ON l.oid = p.prolang
+        WHERE n.nspname = 'public' AND l.lanname IN ('sql', 'plpgsql')
+    ''')
+    functions = {name: (language, body, names, types) for name, language, body, names, types in cur.fetchall()}
+
+    def called(text: str) -> List[str]:
+        return [name for name in functions if re.search(rf'\b{name}\s*\(', text)]
+
+    pending = [name for query in queries for name in called(query)]
+    visited = set()
+    statements = []
+    while pending:
+        name = pending.pop()
+        if name in visited:
+            continue
+        visited.add(name)
+        language, body, arg_names, arg_types = functions[name]
+        pending.extend(called(body))
+        if language != 'sql':
+            continue
+        sql = body.strip().rstrip(';')
+        for position, arg_name in enumerate(arg_names, start=1):
+            sql = re.sub(rf'(?<![.\w]){arg_name}\b', f'${position}', sql)
+        if normalize(sql).lower().startswith(EXPLAINABLE):
+            statements.append(Statement(f'function {name}', sql, tuple(arg_types)))
+    return statements
+
+
+def explain(cur: Any, statement: Statement) -> Dict[str, Any]:
+    if not statement.arg_types:
+        cur.execute('EXPLAIN (FORMAT JSON) ' + statement.sql)
+        return cur.fetchone()[0][0]['Plan']
+    cur.execute('SET LOCAL plan_cache_mode = force_generic_plan')
+    cur.execute(f"PREPARE bench_plans_function ({', '.join(statement.arg_types)}) AS {statement.sql}")
+    cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE bench_plans_function ({', '.join(['NULL'] * len(statement.arg_types))})")
+    return cur.fetchone()[0][0]['Plan']
+
+
+def check_plans(dsn: str, queries: List[str]) -> Tuple[int, List[str]]:
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    statements = [Statement(normalize(query), query) for query in queries if normalize(query).lower().startswith(EXPLAINABLE)]
+    statements += function_statements(cur, queries)
+    conn.rollback()
+    failures = []
+    for statement in statements:
+        text = normalize(statement.label)
+        try:
+            plan = explain(cur, statement)
+        except psycopg2.Error as error:
+            failures.append(f'EXPLAIN failed for {text[:200]}: {error}')
+            plan = None
+        conn.rollback()
+        if statement.arg_types:
+            cur.execute('DEALLOCATE ALL')
+            conn.rollback()
+        for relation, rows in (seq_scans(plan) if plan else []):
+            failures.append(f'Seq Scan on {relation} (~{int(rows)} rows): {text[:300]}')
+    cur.close()
+    conn.close()
+    return len(statements), failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Проверить, что запросы обработчиков не сканируют большие таблицы целиком')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='база, подготовленная bench.seed')
+    parser.add_argument('--iterations', type=int, default=3, help='вызовов каждого сценария')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL required')
+
+    from bench.run import configure_environment, start_s3
+
+    configure_environment(args.dsn)
+    with ExitStack() as stack:
+        start_s3(stack)
+        queries = capture_queries(args.iterations, args.seed)
+
+    checked, failures = check_plans(args.dsn, queries)
+    print(f'{checked} distinct statements checked, including SQL function bodies')
+    for failure in failures:
+        print(f'FAIL {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+'''
+Бенчмарк обработчиков всех функций в одном процессе.
+Каждый сценарий из scenarios.py вызывается iterations раз после прогрева;
+для него считаются p50/p95/p99 задержки, число SQL-запросов и подключений к БД
+на запрос и пик выделенной памяти (tracemalloc, отдельным проходом).
+С --check результат сравнивается с baseline.json и с целями p95 сценариев,
+и регрессия завершает прогон с кодом 1.
+
+    python -m bench.seed --dsn postgresql://localhost/bench --scale 0.01
+    python -m bench.run --dsn postgresql://localhost/bench --check
+'''
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+DEFAULT_TOLERANCE = 0.25
+
+
+def configure_environment(dsn: str) -> None:
+    '''
+    Переменные окружения, которые функции читают при импорте и при вызове
+    '''
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('WORKER_TOKEN', 'bench')
+    # Строка querylog на каждый вызов только мешает выводу бенчмарка
+    os.environ.setdefault('QUERY_LOG', '0')
+    # moto перехватывает запросы к S3 по этому адресу вместо bucket.poehali.dev
+    os.environ.setdefault('MOTO_S3_CUSTOM_ENDPOINTS', 'https://bucket.poehali.dev')
+
+
+def start_s3(stack: ExitStack) -> None:
+    '''
+    Локальная замена S3 в памяти процесса (moto)
+    '''
+    try:
+        from moto import mock_aws as mock_s3
+    except ImportError:
+        from moto import mock_s3
+    import boto3
+
+    stack.enter_context(mock_s3())
+    boto3.client('s3', endpoint_url='https://bucket.poehali.dev').create_bucket(Bucket='files')
+
+
+def load_volumes(dsn: str) -> Dict[str, int]:
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute('SELECT (SELECT MAX(id) FROM users), (SELECT MAX(id) FROM gallery)')
+    users, gallery = cur.fetchone()
+    cur.close()
+    conn.close()
+    return {'users': users or 1, 'gallery': gallery or 1}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(handler: Any, make_event: Any, rng: random.Random, volumes: Dict[str, int],
+            iterations: int, warmup: int, alloc_iterations: int) -> Dict[str, Any]:
+    from bench.functions import counter
+
+    for _ in range(warmup):
+        handler(make_event(rng, volumes), None)
+
+    latencies = []
+    statuses: Dict[int, int] = {}
+    queries_before, connects_before = counter.queries, counter.connects
+    for _ in range(iterations):
+        event = make_event(rng, volumes)
+        started = time.perf_counter()
+        response = handler(event, None)
+        latencies.append((time.perf_counter() - started) * 1000)
+        statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+
+    queries = (counter.queries - queries_before) / iterations
+    connects = (counter.connects - connects_before) / iterations
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(alloc_iterations):
+        event = make_event(rng, volumes)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        handler(event, None)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_per_request': round(queries, 2),
+        'connects_per_request': round(connects, 3),
+        'peak_alloc_kib': round(statistics.median(peaks) / 1024, 1) if peaks else None,
+        'statuses': statuses,
+    }
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms > {base['p95_ms']} ms baseline")
+        # Среднее по запросам зависит от случайных данных (первое ли завершение, есть ли запись), поэтому тоже с допуском
+        if result['queries_per_request'] > base['queries_per_request'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['queries_per_request']} queries/request > {base['queries_per_request']} baseline")
+        if base.get('peak_alloc_kib') and result['peak_alloc_kib'] and result['peak_alloc_kib'] > base['peak_alloc_kib'] * (1 + tolerance):
+            regressions.append(f"{name}: peak alloc {result['peak_alloc_kib']} KiB > {base['peak_alloc_kib']} KiB baseline")
+    return regressions
+
+
+def missed_targets(results: Dict[str, Dict[str, Any]]) -> List[str]:
+    from bench.scenarios import SCENARIOS
+
+    return [
+        f"{scenario.name}: p95 {results[scenario.name]['p95_ms']} ms > {scenario.p95_target_ms} ms target"
+        for scenario in SCENARIOS
+        if scenario.p95_target_ms is not None and scenario.name in results
+        and results[scenario.name]['p95_ms'] > scenario.p95_target_ms
+    ]
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'endpoint':28} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'alloc KiB':>10}  statuses")
+    for name, r in results.items():
+        print(f"{name:28} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+              f"{r['queries_per_request']:8.2f} {r['peak_alloc_kib'] or 0:10.1f}  {r['statuses']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарк обработчиков функций в одном процессе')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='база, подготовленная bench.seed')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--alloc-iterations', type=int, default=20)
+    parser.add_argument('--only', help='подстрока имени сценария, например gallery.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='сохранить результаты в JSON')
+    parser.add_argument('--check', action='store_true', help='сравнить с baseline.json и упасть при регрессии')
+    parser.add_argument('--update-baseline', action='store_true', help='записать результаты в baseline.json')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='допустимый рост p95, числа запросов и памяти, доля')
+    args = parser.parse_args(argv)
+
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL required')
+
+    configure_environment(args.dsn)
+
+    with ExitStack() as stack:
+        start_s3(stack)
+
+        from bench.functions import load_handlers
+        from bench.scenarios import SCENARIOS
+
+        handlers = load_handlers()
+        volumes = load_volumes(args.dsn)
+        rng = random.Random(args.seed)
+
+        results = {}
+        for scenario in SCENARIOS:
+            if args.only and args.only not in scenario.name:
+                continue
+            results[scenario.name] = measure(
+                handlers[scenario.function], scenario.make_event, rng, volumes,
+                args.iterations, args.warmup, args.alloc_iterations
+            )
+
+    print_table(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + '\n', encoding='utf-8')
+
+    if args.update_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text(encoding='utf-8')) if BASELINE_PATH.exists() else {}
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f'baseline written to {BASELINE_PATH}')
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print('no baseline.json yet; run with --update-baseline first', file=sys.stderr)
+            return 1
+        regressions = find_regressions(results, json.loads(BASELINE_PATH.read_text(encoding='utf-8')), args.tolerance)
+        regressions += missed_targets(results)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
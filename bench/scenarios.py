@@ -0,0 +1,98 @@
+'''
+Сценарии бенчмарка: для каждой конечной точки — функция и генератор синтетических событий.
+Идентификаторы пользователей и работ выбираются случайно в пределах засеянных объёмов.
+'''
+import json
+import random
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class Scenario(NamedTuple):
+    name: str
+    function: str
+    make_event: Callable[[random.Random, Dict[str, int]], Dict[str, Any]]
+    # Абсолютная цель по p95 сверх сравнения с baseline.json; проверяется с --check
+    p95_target_ms: Optional[float] = None
+
+
+def get(params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'GET',
+        'headers': {},
+        'queryStringParameters': {key: str(value) for key, value in (params or {}).items()},
+        'body': ''
+    }
+
+
+def post(body: Dict[str, Any], params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'POST',
+        'headers': {'Content-Type': 'application/json'},
+        'queryStringParameters': {key: str(value) for key, value in (params or {}).items()},
+        'body': json.dumps(body)
+    }
+
+
+# Запросы поиска: частые слова, словоформы, фраза, исключение и слово без совпадений
+SEARCH_QUERIES = (
+    'глаза', 'пропорции лица', 'светотень', 'штриховка', 'рисуем нос', '"форма миндаля"',
+    'портрет -скетч', 'объем', 'линии', 'акварель',
+)
+
+
+# Изображение 1x1 PNG для загрузки работы из base64
+TINY_PNG = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+
+
+def user(rng: random.Random, volumes: Dict[str, int]) -> int:
+    return rng.randint(1, volumes['users'])
+
+
+def artwork(rng: random.Random, volumes: Dict[str, int]) -> int:
+    return rng.randint(1, volumes['gallery'])
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario('lessons.list', 'lessons', lambda rng, v: get({'view': 'summary'})),
+    Scenario('lessons.get', 'lessons', lambda rng, v: get({'id': rng.randint(1, 4)})),
+    Scenario('lessons.search', 'lessons', lambda rng, v: get({
+        'action': 'search', 'q': rng.choice(SEARCH_QUERIES), 'offset': rng.choice((0, 0, 0, 20))
+    }), p95_target_ms=50),
+    Scenario('exercises.list', 'exercises', lambda rng, v: get()),
+    Scenario('exercises.batch', 'exercises', lambda rng, v: get({'ids': '1,2,3'})),
+    Scenario('exercises.search', 'exercises', lambda rng, v: get({
+        'action': 'search', 'q': rng.choice(SEARCH_QUERIES)
+    }), p95_target_ms=50),
+    Scenario('exercises.complete', 'exercises', lambda rng, v: post({
+        'user_id': user(rng, v), 'exercise_id': rng.randint(1, 3), 'time_spent': 300, 'score': 90
+    })),
+    Scenario('progress.list', 'progress', lambda rng, v: get({'user_id': user(rng, v)})),
+    Scenario('progress.recommendations', 'progress', lambda rng, v: get({'user_id': user(rng, v), 'action': 'recommendations'})),
+    Scenario('progress.achievements', 'progress', lambda rng, v: get({'user_id': user(rng, v), 'action': 'achievements'})),
+    Scenario('progress.complete', 'progress', lambda rng, v: post({
+        'user_id': user(rng, v), 'lesson_id': rng.randint(1, 4), 'rating': 5
+    })),
+    Scenario('progress.sync', 'progress', lambda rng, v: post({
+        'user_id': user(rng, v),
+        'events': [{'type': 'exercise', 'exercise_id': rng.randint(1, 3), 'time_spent': 120} for _ in range(20)]
+    }, {'action': 'sync'})),
+    Scenario('users.get', 'users', lambda rng, v: get({'id': user(rng, v)})),
+    Scenario('users.leaderboard', 'users', lambda rng, v: get({'action': 'leaderboard', 'id': user(rng, v)})),
+    Scenario('users.leaderboard_week', 'users', lambda rng, v: get({'action': 'leaderboard', 'window': 'week'})),
+    Scenario('gallery.feed', 'gallery', lambda rng, v: get()),
+    Scenario('gallery.author', 'gallery', lambda rng, v: get({'user_id': user(rng, v)})),
+    Scenario('gallery.comments', 'gallery', lambda rng, v: get({'action': 'comments', 'gallery_id': artwork(rng, v)})),
+    Scenario('gallery.like', 'gallery', lambda rng, v: post(
+        {'user_id': user(rng, v), 'gallery_id': artwork(rng, v)}, {'action': 'like'}
+    )),
+    Scenario('gallery.upload_url', 'gallery', lambda rng, v: post(
+        {'user_id': user(rng, v), 'content_type': 'image/png', 'size': 2_000_000}, {'action': 'upload-url'}
+    )),
+    Scenario('gallery.create_inline', 'gallery', lambda rng, v: post(
+        {'user_id': user(rng, v), 'title': 'Набросок', 'image': TINY_PNG}
+    )),
+    Scenario('gallery.process_uploads', 'gallery', lambda rng, v: {
+        **post({}, {'action': 'process-uploads'}), 'headers': {'X-Worker-Token': 'bench'}
+    }),
+    Scenario('bootstrap.user', 'bootstrap', lambda rng, v: get({'user_id': user(rng, v)})),
+]
@@ -0,0 +1,183 @@
+'''
+Подготовка локальной базы для бенчмарка: применяет миграции из db_migrations
+и заполняет таблицы объёмами, близкими к боевым (при scale=1):
+100 тыс. пользователей, 10 млн выполнений упражнений, 1 млн работ в галерее.
+Каталог дополняется CATALOG копиями уроков и упражнений для поиска независимо от scale.
+Данные генерируются на стороне PostgreSQL через generate_series.
+'''
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import psycopg2
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / 'db_migrations'
+
+VOLUMES = {
+    'users': 100_000,
+    'user_exercises': 10_000_000,
+    'gallery': 1_000_000,
+    'gallery_likes': 2_000_000,
+    'gallery_comments': 500_000,
+}
+
+# Сотни уроков и упражнений, как в ожидаемом каталоге; не масштабируются
+CATALOG = {
+    'catalog_lessons': 500,
+    'catalog_exercises': 200,
+}
+
+SEED_SQL = [
+    ('users', '''
+        INSERT INTO users (username, email, level, created_at)
+        SELECT 'user_' || i, 'user_' || i || '@example.com',
+               (ARRAY['Новичок', 'Ученик', 'Художник', 'Мастер'])[1 + i %% 4],
+               CURRENT_TIMESTAMP - (i %% 730) * INTERVAL '1 day'
+        FROM generate_series(1, %(users)s) AS i
+    '''),
+    ('user_progress', '''
+        INSERT INTO user_progress (user_id, lesson_id, completed, completed_at, rating)
+        SELECT u.id, l.id, true,
+               (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') - ((u.id + l.id) %% 365) * INTERVAL '1 day',
+               1 + (u.id + l.id) %% 5
+        FROM users u
+        JOIN lessons l ON l.order_index <= 1 + u.id %% 4
+    '''),
+    ('user_exercises', '''
+        INSERT INTO user_exercises (user_id, exercise_id, completed_at, time_spent, score)
+        SELECT 1 + (i * 7919) %% %(users)s,
+               e.ids[1 + i %% array_length(e.ids, 1)],
+               (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') - (i %% 525600) * INTERVAL '1 minute',
+               60 + i %% 1200,
+               50 + i %% 51
+        FROM generate_series(1, %(user_exercises)s) AS i,
+             (SELECT array_agg(id ORDER BY id) AS ids FROM exercises) AS e
+    '''),
+    ('gallery', '''
+        INSERT INTO gallery (user_id, title, description, image_url, likes_count, comments_count, created_at)
+        SELECT 1 + (i * 104729) %% %(users)s,
+               'Работа ' || i,
+               'Описание работы ' || i,
+               'https://cdn.example.com/bench/' || i || '.png',
+               0, 0,
+               CURRENT_TIMESTAMP - (i %% 1051200) * INTERVAL '30 seconds'
+        FROM generate_series(1, %(gallery)s) AS i
+    '''),
+    ('gallery_likes', '''
+        INSERT INTO gallery_likes (gallery_id, user_id)
+        SELECT 1 + (i * 31) %% %(gallery)s, 1 + i %% %(users)s
+        FROM generate_series(1, %(gallery_likes)s) AS i
+        ON CONFLICT (gallery_id, user_id) DO NOTHING
+    '''),
+    ('gallery_comments', '''
+        INSERT INTO gallery_comments (gallery_id, user_id, comment)
+        SELECT 1 + (i * 17) %% %(gallery)s, 1 + (i * 13) %% %(users)s, 'Комментарий ' || i
+        FROM generate_series(1, %(gallery_comments)s) AS i
+    '''),
+    ('gallery likes_count', '''
+        UPDATE gallery g
+        SET likes_count = l.likes
+        FROM (SELECT gallery_id, COUNT(*) AS likes FROM gallery_likes GROUP BY gallery_id) l
+        WHERE g.id = l.gallery_id
+    '''),
+    ('gallery comments_count', '''
+        UPDATE gallery g
+        SET comments_count = c.comments
+        FROM (SELECT gallery_id, COUNT(*) AS comments FROM gallery_comments GROUP BY gallery_id) c
+        WHERE g.id = c.gallery_id
+    '''),
+    ('total_xp', '''
+        UPDATE users u
+        SET total_xp = xp.total
+        FROM (
+            SELECT ue.user_id, SUM(e.points) AS total
+            FROM user_exercises ue
+            JOIN exercises e ON e.id = ue.exercise_id
+            GROUP BY ue.user_id
+        ) xp
+        WHERE u.id = xp.user_id
+    '''),
+    ('user_xp_weekly', '''
+        INSERT INTO user_xp_weekly (week_start, user_id, xp)
+        SELECT leaderboard_week_start(), ue.user_id, SUM(e.points)
+        FROM user_exercises ue
+        JOIN exercises e ON e.id = ue.exercise_id
+        WHERE ue.completed_at >= leaderboard_week_start()
+        GROUP BY ue.user_id
+        ON CONFLICT (week_start, user_id) DO UPDATE SET xp = EXCLUDED.xp
+    '''),
+    # Копии добавляются последними, чтобы выполнения и XP выше считались по исходному каталогу
+    ('catalog lessons', '''
+        INSERT INTO lessons (title, description, content, duration, difficulty, icon, order_index)
+        SELECT l.title || ', часть ' || i, l.description, l.content, l.duration, l.difficulty, l.icon, 1000 + i
+        FROM generate_series(1, %(catalog_lessons)s) AS i
+        JOIN (SELECT *, row_number() OVER (ORDER BY order_index) AS n FROM lessons) l
+          ON l.n = 1 + i %% (SELECT COUNT(*) FROM lessons)
+    '''),
+    ('catalog exercises', '''
+        INSERT INTO exercises (title, description, time_minutes, points, icon, difficulty)
+        SELECT e.title || ', вариант ' || i, e.description, e.time_minutes, e.points, e.icon, e.difficulty
+        FROM generate_series(1, %(catalog_exercises)s) AS i
+        JOIN (SELECT *, row_number() OVER (ORDER BY id) AS n FROM exercises) e
+          ON e.n = 1 + i %% (SELECT COUNT(*) FROM exercises)
+    '''),
+]
+
+
+def apply_migrations(cur: Any) -> None:
+    for path in sorted(MIGRATIONS_DIR.glob('V*.sql'), key=lambda p: int(p.name[1:].split('__')[0])):
+        print(f'migration {path.name}')
+        cur.execute(path.read_text(encoding='utf-8'))
+
+
+def run_batches(conn: Any, function: str, batch_size: int = 5000) -> None:
+    cur = conn.cursor()
+    last_user_id = 0
+    while last_user_id is not None:
+        cur.execute(f'SELECT {function}(%s, %s)', (last_user_id, batch_size))
+        last_user_id = cur.fetchone()[0]
+        conn.commit()
+    cur.close()
+
+
+def seed(dsn: str, scale: float) -> Dict[str, int]:
+    volumes = {table: max(1, int(count * scale)) for table, count in VOLUMES.items()}
+    volumes.update(CATALOG)
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+
+    apply_migrations(cur)
+    conn.commit()
+
+    for name, sql in SEED_SQL:
+        started = time.perf_counter()
+        cur.execute(sql, volumes)
+        conn.commit()
+        print(f'{name}: {cur.rowcount} rows in {time.perf_counter() - started:.1f}s')
+
+    run_batches(conn, 'reconcile_user_stats')
+    run_batches(conn, 'rebuild_user_streaks')
+
+    conn.autocommit = True
+    cur.execute('ANALYZE')
+    cur.close()
+    conn.close()
+    return volumes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Заполнить локальную базу данными для бенчмарка')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'), help='пустая база PostgreSQL (BENCH_DATABASE_URL)')
+    parser.add_argument('--scale', type=float, default=1.0, help='доля от боевых объёмов, например 0.01 для быстрого прогона')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error('--dsn or BENCH_DATABASE_URL required')
+
+    print(seed(args.dsn, args.scale))
+
+
+if __name__ == '__main__':
+    main()
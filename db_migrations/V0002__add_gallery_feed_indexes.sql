@@ -0,0 +1,9 @@
+-- Keyset pagination of the gallery feed orders by (created_at, id), so created_at must not be NULL
+UPDATE gallery SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+ALTER TABLE gallery ALTER COLUMN created_at SET NOT NULL;
+
+-- Global feed: newest first, id breaks ties between equal timestamps
+CREATE INDEX IF NOT EXISTS idx_gallery_created_at_id ON gallery (created_at DESC, id DESC);
+
+-- Per-author feed for profile pages
+CREATE INDEX IF NOT EXISTS idx_gallery_user_created_at_id ON gallery (user_id, created_at DESC, id DESC);
@@ -0,0 +1,8 @@
+-- Downscaled WebP copies of each artwork: [{"key": "...", "width": 640}, ...]; NULL until processed
+ALTER TABLE gallery ADD COLUMN IF NOT EXISTS renditions JSONB;
+-- Tiny blurred JPEG shown while the real image loads (data: URI)
+ALTER TABLE gallery ADD COLUMN IF NOT EXISTS placeholder TEXT;
+-- When a rendition worker took the row; stale claims are retried
+ALTER TABLE gallery ADD COLUMN IF NOT EXISTS renditions_claimed_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_gallery_renditions_pending ON gallery (id) WHERE renditions IS NULL;
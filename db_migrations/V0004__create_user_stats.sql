@@ -0,0 +1,46 @@
+-- Per-user counters maintained by the write paths, so profile reads and achievement checks are O(1)
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    completed_lessons INTEGER NOT NULL DEFAULT 0,
+    completed_exercises INTEGER NOT NULL DEFAULT 0,
+    exercise_completions INTEGER NOT NULL DEFAULT 0,
+    total_likes INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Recomputes counters from history for users with id > after_user_id, batch_size users at a time.
+-- Returns the last processed user id, or NULL when there are no users left.
+CREATE OR REPLACE FUNCTION reconcile_user_stats(after_user_id INTEGER, batch_size INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    last_user_id INTEGER;
+BEGIN
+    SELECT MAX(id) INTO last_user_id
+    FROM (SELECT id FROM users WHERE id > after_user_id ORDER BY id LIMIT batch_size) batch;
+
+    IF last_user_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO user_stats (user_id, completed_lessons, completed_exercises, exercise_completions, total_likes, updated_at)
+    SELECT u.id,
+           (SELECT COUNT(*) FROM user_progress up WHERE up.user_id = u.id AND up.completed = true),
+           (SELECT COUNT(DISTINCT ue.exercise_id) FROM user_exercises ue WHERE ue.user_id = u.id),
+           (SELECT COUNT(*) FROM user_exercises ue WHERE ue.user_id = u.id),
+           (SELECT COALESCE(SUM(g.likes_count), 0) FROM gallery g WHERE g.user_id = u.id),
+           CURRENT_TIMESTAMP
+    FROM users u
+    WHERE u.id > after_user_id AND u.id <= last_user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET completed_lessons = EXCLUDED.completed_lessons,
+        completed_exercises = EXCLUDED.completed_exercises,
+        exercise_completions = EXCLUDED.exercise_completions,
+        total_likes = EXCLUDED.total_likes,
+        updated_at = EXCLUDED.updated_at;
+
+    RETURN last_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill counters for existing users
+SELECT reconcile_user_stats(0, 2147483647);
@@ -0,0 +1,67 @@
+-- Consecutive active days per user, updated by every lesson or exercise completion
+CREATE TABLE IF NOT EXISTS user_streaks (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    last_active_date DATE NOT NULL,
+    current_streak INTEGER NOT NULL DEFAULT 1,
+    best_streak INTEGER NOT NULL DEFAULT 1,
+    timezone VARCHAR(64) NOT NULL DEFAULT 'Europe/Moscow',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Rebuilds streaks from user_progress and user_exercises history for users with
+-- id > after_user_id, batch_size users at a time. History timestamps are stored in UTC
+-- and converted to each user's time zone before being grouped into days.
+-- Returns the last processed user id, or NULL when there are no users left.
+CREATE OR REPLACE FUNCTION rebuild_user_streaks(after_user_id INTEGER, batch_size INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    last_user_id INTEGER;
+BEGIN
+    SELECT MAX(id) INTO last_user_id
+    FROM (SELECT id FROM users WHERE id > after_user_id ORDER BY id LIMIT batch_size) batch;
+
+    IF last_user_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    WITH activity AS (
+        SELECT user_id, completed_at FROM user_progress
+        WHERE completed = true AND completed_at IS NOT NULL
+        AND user_id > after_user_id AND user_id <= last_user_id
+        UNION ALL
+        SELECT user_id, completed_at FROM user_exercises
+        WHERE completed_at IS NOT NULL
+        AND user_id > after_user_id AND user_id <= last_user_id
+    ), days AS (
+        SELECT DISTINCT a.user_id,
+               (a.completed_at AT TIME ZONE 'UTC' AT TIME ZONE COALESCE(s.timezone, 'Europe/Moscow'))::date AS day
+        FROM activity a
+        LEFT JOIN user_streaks s ON s.user_id = a.user_id
+    ), islands AS (
+        SELECT user_id, day, day - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day))::int AS island
+        FROM days
+    ), runs AS (
+        SELECT user_id, MAX(day) AS last_day, COUNT(*)::int AS length
+        FROM islands
+        GROUP BY user_id, island
+    ), summary AS (
+        SELECT DISTINCT ON (user_id) user_id, last_day, length,
+               MAX(length) OVER (PARTITION BY user_id) AS best
+        FROM runs
+        ORDER BY user_id, last_day DESC
+    )
+    INSERT INTO user_streaks (user_id, last_active_date, current_streak, best_streak, updated_at)
+    SELECT user_id, last_day, length, best, CURRENT_TIMESTAMP
+    FROM summary
+    ON CONFLICT (user_id) DO UPDATE
+    SET last_active_date = EXCLUDED.last_active_date,
+        current_streak = EXCLUDED.current_streak,
+        best_streak = EXCLUDED.best_streak,
+        updated_at = EXCLUDED.updated_at;
+
+    RETURN last_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill streaks for existing users
+SELECT rebuild_user_streaks(0, 2147483647);
@@ -0,0 +1,9 @@
+-- Pending changes to gallery.likes_count / comments_count. Likes and comments append a row
+-- here instead of updating the gallery row; a periodic flush folds them into the counters.
+CREATE TABLE IF NOT EXISTS gallery_counter_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    gallery_id INTEGER NOT NULL REFERENCES gallery(id),
+    likes_delta SMALLINT NOT NULL DEFAULT 0,
+    comments_delta SMALLINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
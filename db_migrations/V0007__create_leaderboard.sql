@@ -0,0 +1,34 @@
+-- All-time leaderboard: top-N and snapshot reads walk this index instead of sorting users
+CREATE INDEX IF NOT EXISTS idx_users_total_xp_id ON users (total_xp DESC, id);
+
+-- First day of the current leaderboard week (weeks start on Monday, Moscow time)
+CREATE OR REPLACE FUNCTION leaderboard_week_start() RETURNS DATE AS $$
+    SELECT date_trunc('week', CURRENT_TIMESTAMP AT TIME ZONE 'Europe/Moscow')::date
+$$ LANGUAGE sql STABLE;
+
+-- XP earned per user per week, incremented by every lesson or exercise completion
+CREATE TABLE IF NOT EXISTS user_xp_weekly (
+    week_start DATE NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    xp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_start, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_xp_weekly_week_xp ON user_xp_weekly (week_start, xp DESC, user_id);
+
+-- Backfill the current week from completion history (lessons give 100 XP, exercises their points)
+INSERT INTO user_xp_weekly (week_start, user_id, xp)
+SELECT leaderboard_week_start(), user_id, SUM(xp)
+FROM (
+    SELECT up.user_id, 100 AS xp
+    FROM user_progress up
+    WHERE up.completed = true
+    AND (up.completed_at AT TIME ZONE 'UTC' AT TIME ZONE 'Europe/Moscow')::date >= leaderboard_week_start()
+    UNION ALL
+    SELECT ue.user_id, e.points
+    FROM user_exercises ue
+    JOIN exercises e ON e.id = ue.exercise_id
+    WHERE (ue.completed_at AT TIME ZONE 'UTC' AT TIME ZONE 'Europe/Moscow')::date >= leaderboard_week_start()
+) earned
+GROUP BY user_id
+ON CONFLICT (week_start, user_id) DO UPDATE SET xp = EXCLUDED.xp;
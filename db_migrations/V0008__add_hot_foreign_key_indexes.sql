@@ -0,0 +1,14 @@
+-- Exercise history is read per user: first-completion check and batch sync dedupe by (user_id, exercise_id),
+-- reconcile_user_stats counts per user, rebuild_user_streaks reads completed_at per user range.
+-- INCLUDE (completed_at) lets all of them run as index-only scans.
+CREATE INDEX IF NOT EXISTS idx_user_exercises_user_exercise ON user_exercises (user_id, exercise_id) INCLUDE (completed_at);
+
+-- Latest comments of one artwork, newest first
+CREATE INDEX IF NOT EXISTS idx_gallery_comments_gallery_created_at_id ON gallery_comments (gallery_id, created_at DESC, id DESC);
+
+-- Achievement rules are looked up by type and threshold
+CREATE INDEX IF NOT EXISTS idx_achievements_requirement ON achievements (requirement_type, requirement_value);
+
+-- user_achievements(user_id) is served by UNIQUE (user_id, achievement_id), gallery(user_id) by
+-- idx_gallery_user_created_at_id, user_progress(user_id) by UNIQUE (user_id, lesson_id) and
+-- gallery_likes(gallery_id) by UNIQUE (gallery_id, user_id): no separate single-column indexes needed.
@@ -0,0 +1,16 @@
+-- Full-text search over the catalog: a stored tsvector per row, generated from the searchable columns
+-- with the russian configuration (stemming, stop words), weighted title > description > content for ranking
+ALTER TABLE lessons ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(content, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_lessons_search_vector ON lessons USING GIN (search_vector);
+
+ALTER TABLE exercises ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_exercises_search_vector ON exercises USING GIN (search_vector);
@@ -0,0 +1,67 @@
+-- Precomputed "what next" per user: refreshed by the completion write paths, so the read is one primary-key lookup
+CREATE TABLE IF NOT EXISTS user_recommendations (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    level INTEGER NOT NULL DEFAULT 1,
+    lesson_ids INTEGER[] NOT NULL DEFAULT '{}',
+    exercise_ids INTEGER[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Catalog difficulty labels in increasing order; unknown labels count as the middle level
+CREATE OR REPLACE FUNCTION difficulty_rank(difficulty VARCHAR) RETURNS INTEGER AS $$
+    SELECT CASE difficulty
+        WHEN 'Начальный' THEN 1
+        WHEN 'Средний' THEN 2
+        WHEN 'Продвинутый' THEN 3
+        ELSE 2
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Recomputes recommendations for the given users only; completion paths pass the users they just changed.
+-- level: hardest difficulty among completed lessons (1 for a new user).
+-- Lessons: not yet completed, at most one level above, own level and easier first, then in course order.
+-- Exercises: at most one level above, never done first, then least recently done, closest to the level, cheapest.
+-- Per-user lookups use UNIQUE (user_id, lesson_id) and idx_user_exercises_user_exercise.
+CREATE OR REPLACE FUNCTION refresh_user_recommendations(user_ids INTEGER[], lesson_limit INTEGER, exercise_limit INTEGER)
+RETURNS VOID AS $$
+    INSERT INTO user_recommendations (user_id, level, lesson_ids, exercise_ids, updated_at)
+    SELECT u.id,
+           lvl.level,
+           ARRAY(
+               SELECT l.id
+               FROM lessons l
+               WHERE difficulty_rank(l.difficulty) <= lvl.level + 1
+                 AND NOT EXISTS (
+                     SELECT 1 FROM user_progress up
+                     WHERE up.user_id = u.id AND up.lesson_id = l.id AND up.completed = true
+                 )
+               ORDER BY difficulty_rank(l.difficulty) > lvl.level, l.order_index
+               LIMIT lesson_limit
+           ),
+           ARRAY(
+               SELECT e.id
+               FROM exercises e
+               LEFT JOIN LATERAL (
+                   SELECT MAX(ue.completed_at) AS last_completed_at
+                   FROM user_exercises ue
+                   WHERE ue.user_id = u.id AND ue.exercise_id = e.id
+               ) done ON true
+               WHERE difficulty_rank(e.difficulty) <= lvl.level + 1
+               ORDER BY done.last_completed_at NULLS FIRST, abs(difficulty_rank(e.difficulty) - lvl.level), e.points, e.id
+               LIMIT exercise_limit
+           ),
+           CURRENT_TIMESTAMP
+    FROM users u
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(MAX(difficulty_rank(l.difficulty)), 1) AS level
+        FROM user_progress up
+        JOIN lessons l ON l.id = up.lesson_id
+        WHERE up.user_id = u.id AND up.completed = true
+    ) lvl
+    WHERE u.id = ANY(user_ids)
+    ON CONFLICT (user_id) DO UPDATE
+    SET level = EXCLUDED.level,
+        lesson_ids = EXCLUDED.lesson_ids,
+        exercise_ids = EXCLUDED.exercise_ids,
+        updated_at = EXCLUDED.updated_at;
+$$ LANGUAGE sql;
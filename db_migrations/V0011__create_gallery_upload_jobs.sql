@@ -0,0 +1,20 @@
+-- Lifecycle of an artwork image: 'pending' until the upload worker has stored it in S3, then 'ready' (or 'failed').
+-- Existing rows and direct S3 uploads are 'ready' from the start; feeds show only 'ready' rows.
+ALTER TABLE gallery ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'ready';
+
+-- Durable queue of inline (base64) uploads accepted by POST / and not yet written to S3.
+-- Workers claim batches with FOR UPDATE SKIP LOCKED; a claim older than the timeout is retried,
+-- up to the attempt limit. Finished jobs are deleted, failed ones keep last_error without the payload.
+CREATE TABLE IF NOT EXISTS gallery_upload_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    gallery_id INTEGER NOT NULL UNIQUE REFERENCES gallery(id) ON DELETE CASCADE,
+    object_key TEXT NOT NULL,
+    content_type VARCHAR(50) NOT NULL,
+    payload TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_gallery_upload_jobs_queued ON gallery_upload_jobs (id) WHERE payload IS NOT NULL;
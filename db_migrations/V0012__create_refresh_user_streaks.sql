@@ -0,0 +1,63 @@
+-- Rebuilds streaks of the given users from user_progress and user_exercises history, so completions
+-- with past timestamps (offline sync) land on their own days. new_timezone, when not NULL, replaces the
+-- stored time zone before history is grouped into days. Returns each user's current streak.
+CREATE OR REPLACE FUNCTION refresh_user_streaks(user_ids INTEGER[], new_timezone VARCHAR)
+RETURNS TABLE (streak_user_id INTEGER, streak_current INTEGER) AS $$
+    WITH activity AS (
+        SELECT user_id, completed_at FROM user_progress
+        WHERE completed = true AND completed_at IS NOT NULL AND user_id = ANY(user_ids)
+        UNION ALL
+        SELECT user_id, completed_at FROM user_exercises
+        WHERE completed_at IS NOT NULL AND user_id = ANY(user_ids)
+    ), zones AS (
+        SELECT u.id AS user_id, COALESCE(new_timezone, s.timezone, 'Europe/Moscow') AS timezone
+        FROM unnest(user_ids) AS u (id)
+        LEFT JOIN user_streaks s ON s.user_id = u.id
+    ), days AS (
+        SELECT DISTINCT a.user_id, (a.completed_at AT TIME ZONE 'UTC' AT TIME ZONE z.timezone)::date AS day
+        FROM activity a
+        JOIN zones z ON z.user_id = a.user_id
+    ), islands AS (
+        SELECT user_id, day, day - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day))::int AS island
+        FROM days
+    ), runs AS (
+        SELECT user_id, MAX(day) AS last_day, COUNT(*)::int AS length
+        FROM islands
+        GROUP BY user_id, island
+    ), summary AS (
+        SELECT DISTINCT ON (user_id) user_id, last_day, length,
+               MAX(length) OVER (PARTITION BY user_id) AS best
+        FROM runs
+        ORDER BY user_id, last_day DESC
+    )
+    INSERT INTO user_streaks (user_id, last_active_date, current_streak, best_streak, timezone, updated_at)
+    SELECT summary.user_id, last_day, length, best, z.timezone, CURRENT_TIMESTAMP
+    FROM summary
+    JOIN zones z ON z.user_id = summary.user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET last_active_date = EXCLUDED.last_active_date,
+        current_streak = EXCLUDED.current_streak,
+        best_streak = EXCLUDED.best_streak,
+        timezone = EXCLUDED.timezone,
+        updated_at = EXCLUDED.updated_at
+    RETURNING user_id, current_streak
+$$ LANGUAGE sql;
+
+-- The batch rebuild now delegates to refresh_user_streaks; behaviour is unchanged
+CREATE OR REPLACE FUNCTION rebuild_user_streaks(after_user_id INTEGER, batch_size INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    batch INTEGER[];
+BEGIN
+    SELECT array_agg(id ORDER BY id) INTO batch
+    FROM (SELECT id FROM users WHERE id > after_user_id ORDER BY id LIMIT batch_size) ids;
+
+    IF batch IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM refresh_user_streaks(batch, NULL);
+
+    RETURN batch[array_length(batch, 1)];
+END;
+$$ LANGUAGE plpgsql;
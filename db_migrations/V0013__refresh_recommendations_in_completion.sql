@@ -0,0 +1,57 @@
+-- Completion statements now refresh recommendations in the same statement as the completion write.
+-- The refresh cannot rely on seeing that write, so the just-completed lesson or exercise is passed in:
+-- the lesson counts as completed (and towards the level), the exercise as the most recently done.
+-- Both are meant for single-user calls; batch callers leave them NULL.
+DROP FUNCTION IF EXISTS refresh_user_recommendations(INTEGER[], INTEGER, INTEGER);
+
+CREATE OR REPLACE FUNCTION refresh_user_recommendations(
+    user_ids INTEGER[], lesson_limit INTEGER, exercise_limit INTEGER,
+    completed_lesson_id INTEGER DEFAULT NULL, completed_exercise_id INTEGER DEFAULT NULL
+)
+RETURNS VOID AS $$
+    INSERT INTO user_recommendations (user_id, level, lesson_ids, exercise_ids, updated_at)
+    SELECT u.id,
+           lvl.level,
+           ARRAY(
+               SELECT l.id
+               FROM lessons l
+               WHERE difficulty_rank(l.difficulty) <= lvl.level + 1
+                 AND l.id IS DISTINCT FROM completed_lesson_id
+                 AND NOT EXISTS (
+                     SELECT 1 FROM user_progress up
+                     WHERE up.user_id = u.id AND up.lesson_id = l.id AND up.completed = true
+                 )
+               ORDER BY difficulty_rank(l.difficulty) > lvl.level, l.order_index
+               LIMIT lesson_limit
+           ),
+           ARRAY(
+               SELECT e.id
+               FROM exercises e
+               LEFT JOIN LATERAL (
+                   SELECT MAX(ue.completed_at) AS last_completed_at
+                   FROM user_exercises ue
+                   WHERE ue.user_id = u.id AND ue.exercise_id = e.id
+               ) done ON true
+               WHERE difficulty_rank(e.difficulty) <= lvl.level + 1
+               ORDER BY e.id IS NOT DISTINCT FROM completed_exercise_id,
+                        done.last_completed_at NULLS FIRST, abs(difficulty_rank(e.difficulty) - lvl.level), e.points, e.id
+               LIMIT exercise_limit
+           ),
+           CURRENT_TIMESTAMP
+    FROM users u
+    CROSS JOIN LATERAL (
+        SELECT GREATEST(
+                   COALESCE(MAX(difficulty_rank(l.difficulty)), 1),
+                   (SELECT difficulty_rank(difficulty) FROM lessons WHERE id = completed_lesson_id)
+               ) AS level
+        FROM user_progress up
+        JOIN lessons l ON l.id = up.lesson_id
+        WHERE up.user_id = u.id AND up.completed = true
+    ) lvl
+    WHERE u.id = ANY(user_ids)
+    ON CONFLICT (user_id) DO UPDATE
+    SET level = EXCLUDED.level,
+        lesson_ids = EXCLUDED.lesson_ids,
+        exercise_ids = EXCLUDED.exercise_ids,
+        updated_at = EXCLUDED.updated_at;
+$$ LANGUAGE sql;
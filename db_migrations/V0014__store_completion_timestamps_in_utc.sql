@@ -0,0 +1,5 @@
+-- Completion timestamps (user_progress.completed_at, user_exercises.completed_at) are naive UTC:
+-- the streak backfill and refresh_user_streaks() read them with AT TIME ZONE 'UTC', and the
+-- completion handlers write CURRENT_TIMESTAMP AT TIME ZONE 'UTC' so both see the same local day.
+-- The column default follows the same rule for any writer that leaves it out.
+ALTER TABLE user_exercises ALTER COLUMN completed_at SET DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC');
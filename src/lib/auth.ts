@@ -7,6 +7,9 @@ interface User {
   avatar_url?: string;
   completed_lessons?: number;
   completed_exercises?: number;
+  total_likes?: number;
+  current_streak?: number;
+  best_streak?: number;
 }
 
 export const AUTH_STORAGE_KEY = 'artlearn_user';
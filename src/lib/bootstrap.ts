@@ -0,0 +1,89 @@
+import func2url from '../../backend/func2url.json';
+import { GALLERY_URL } from '@/lib/gallery';
+
+const BOOTSTRAP_URL: string | undefined = (func2url as Record<string, string>).bootstrap;
+const SECTIONS_STORAGE_KEY = 'artlearn_sections';
+const SHARED_SECTIONS = ['lessons', 'exercises', 'gallery'];
+
+export interface BootstrapData {
+  lessons: any[];
+  exercises: any[];
+  gallery: any[];
+  user?: any;
+  achievements?: any[];
+}
+
+interface Section {
+  etag: string;
+  data?: any;
+  unchanged?: boolean;
+}
+
+type StoredSections = Record<string, { etag: string; data: any }>;
+
+const readStoredSections = (): StoredSections => {
+  try {
+    return JSON.parse(localStorage.getItem(SECTIONS_STORAGE_KEY) || '{}');
+  } catch {
+    return {};
+  }
+};
+
+const getJson = async (url: string) => {
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error(`Request failed: ${response.status}`);
+  }
+  return response.json();
+};
+
+// Пока функция bootstrap не задеплоена, разделы собираются из отдельных функций
+const loadSeparately = async (userId?: number): Promise<BootstrapData> => {
+  const [lessons, exercises, gallery, achievements] = await Promise.all([
+    getJson('https://functions.poehali.dev/93feccd4-0642-4834-8aef-d137b6476758?view=summary'),
+    getJson('https://functions.poehali.dev/d0645bed-f351-4ea9-9d98-dded219384b0'),
+    getJson(GALLERY_URL),
+    userId
+      ? getJson(`https://functions.poehali.dev/38a6e764-3373-4fa7-8067-5c764e8c0904?user_id=${userId}&action=achievements`)
+      : Promise.resolve(undefined)
+  ]);
+  return { lessons, exercises, gallery, achievements };
+};
+
+export const loadBootstrap = async (userId?: number): Promise<BootstrapData> => {
+  if (!BOOTSTRAP_URL) {
+    return loadSeparately(userId);
+  }
+
+  const stored = readStoredSections();
+  const params = new URLSearchParams();
+  if (userId) {
+    params.set('user_id', String(userId));
+  }
+  const known = SHARED_SECTIONS.map(name => stored[name]?.etag).filter(Boolean) as string[];
+  if (known.length) {
+    params.set('known', known.map(etag => etag.replace(/"/g, '')).join(','));
+  }
+
+  const { sections }: { sections: Record<string, Section> } = await getJson(`${BOOTSTRAP_URL}?${params}`);
+  const result: Record<string, any> = {};
+
+  for (const [name, section] of Object.entries(sections)) {
+    if (section.unchanged && stored[name]) {
+      result[name] = stored[name].data;
+    } else {
+      result[name] = section.data;
+      if (SHARED_SECTIONS.includes(name)) {
+        stored[name] = { etag: section.etag, data: section.data };
+      }
+    }
+  }
+
+  try {
+    localStorage.setItem(SECTIONS_STORAGE_KEY, JSON.stringify(stored));
+  } catch {
+    // Переполненное хранилище только отключает сверку по ETag
+  }
+
+  return result as BootstrapData;
+};
@@ -0,0 +1,75 @@
+export const GALLERY_URL = 'https://functions.poehali.dev/d1439467-0fbd-47d5-9496-bae1cd615868';
+
+interface UploadTarget {
+  key: string;
+  url?: string;
+  upload_id?: string;
+  part_size?: number;
+  part_urls?: string[];
+}
+
+const postJson = async (url: string, body: unknown) => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+
+  if (!response.ok) {
+    throw new Error(`Request failed: ${response.status}`);
+  }
+
+  return response.json();
+};
+
+const putToStorage = async (url: string, body: Blob, contentType?: string): Promise<string> => {
+  const response = await fetch(url, {
+    method: 'PUT',
+    headers: contentType ? { 'Content-Type': contentType } : undefined,
+    body
+  });
+
+  if (!response.ok) {
+    throw new Error(`Upload failed: ${response.status}`);
+  }
+
+  return response.headers.get('ETag') || '';
+};
+
+export const uploadImage = async (file: File, userId: number): Promise<string> => {
+  const target: UploadTarget = await postJson(`${GALLERY_URL}?action=upload-url`, {
+    user_id: userId,
+    content_type: file.type || 'image/png',
+    size: file.size
+  });
+
+  if (target.url) {
+    await putToStorage(target.url, file, file.type || 'image/png');
+    return target.key;
+  }
+
+  const partSize = target.part_size!;
+  const parts = await Promise.all(
+    target.part_urls!.map(async (url, index) => ({
+      part_number: index + 1,
+      etag: await putToStorage(url, file.slice(index * partSize, (index + 1) * partSize))
+    }))
+  );
+
+  await postJson(`${GALLERY_URL}?action=complete-upload`, {
+    user_id: userId,
+    key: target.key,
+    upload_id: target.upload_id,
+    parts
+  });
+
+  return target.key;
+};
+
+export const createArtwork = async (userId: number, key: string, title: string, description: string) => {
+  return postJson(GALLERY_URL, { user_id: userId, key, title, description });
+};
+
+export const likeArtwork = async (userId: number, galleryId: number): Promise<{ liked: boolean; changed: boolean }> => {
+  return postJson(`${GALLERY_URL}?action=like`, { user_id: userId, gallery_id: galleryId });
+};
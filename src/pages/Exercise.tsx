@@ -31,9 +31,8 @@ const Exercise = () => {
   useEffect(() => {
     const fetchExercise = async () => {
       try {
-        const response = await fetch('https://functions.poehali.dev/d0645bed-f351-4ea9-9d98-dded219384b0');
-        const exercises = await response.json();
-        const foundExercise = exercises.find((ex: Exercise) => ex.id === parseInt(id || '0'));
+        const response = await fetch(`https://functions.poehali.dev/d0645bed-f351-4ea9-9d98-dded219384b0?id=${id}`);
+        const foundExercise: Exercise | null = response.ok ? await response.json() : null;
         
         if (foundExercise) {
           setExercise(foundExercise);
@@ -99,7 +98,8 @@ const Exercise = () => {
           user_id: user.id,
           exercise_id: exercise.id,
           time_spent: timeSpent,
-          score: 100
+          score: 100,
+          timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
         })
       });
 
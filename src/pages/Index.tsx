@@ -13,7 +13,9 @@ import Icon from "@/components/ui/icon";
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar";
 import { useToast } from "@/hooks/use-toast";
 import AuthDialog from "@/components/AuthDialog";
-import { getCurrentUser, isAuthenticated } from "@/lib/auth";
+import { getCurrentUser, isAuthenticated, setCurrentUser } from "@/lib/auth";
+import { loadBootstrap } from "@/lib/bootstrap";
+import { GALLERY_URL, createArtwork, likeArtwork, uploadImage } from "@/lib/gallery";
 
 const Index = () => {
   const navigate = useNavigate();
@@ -39,10 +41,9 @@ const Index = () => {
       setAuthDialogOpen(true);
     }
 
-    fetch('https://functions.poehali.dev/93feccd4-0642-4834-8aef-d137b6476758')
-      .then(res => res.json())
+    loadBootstrap(user?.id)
       .then(data => {
-        const formattedLessons = data.map((lesson: any) => ({
+        const formattedLessons = data.lessons.map((lesson: any) => ({
           id: lesson.id,
           title: lesson.title,
           description: lesson.description,
@@ -52,13 +53,8 @@ const Index = () => {
           completed: false
         }));
         setLessons(formattedLessons);
-      })
-      .catch(err => console.error('Error loading lessons:', err));
 
-    fetch('https://functions.poehali.dev/d0645bed-f351-4ea9-9d98-dded219384b0')
-      .then(res => res.json())
-      .then(data => {
-        const formattedExercises = data.map((ex: any) => ({
+        const formattedExercises = data.exercises.map((ex: any) => ({
           id: ex.id,
           title: ex.title,
           time: `${ex.time_minutes} мин`,
@@ -66,34 +62,49 @@ const Index = () => {
           icon: ex.icon
         }));
         setExercises(formattedExercises);
-      })
-      .catch(err => console.error('Error loading exercises:', err));
 
-    if (user) {
-      fetch(`https://functions.poehali.dev/38a6e764-3373-4fa7-8067-5c764e8c0904?user_id=${user.id}&action=achievements`)
-        .then(res => res.json())
-        .then(data => {
-          const formattedAch = data.map((a: any) => ({
+        setGallery(data.gallery);
+
+        if (data.achievements) {
+          const formattedAch = data.achievements.map((a: any) => ({
             id: a.id,
             name: a.name,
             icon: a.icon,
             unlocked: a.unlocked
           }));
           setAchievements(formattedAch);
-        })
-        .catch(err => console.error('Error loading achievements:', err));
-    }
+        }
 
-    loadGallery();
+        if (data.user) {
+          setCurrentUser(data.user);
+        }
+      })
+      .catch(err => console.error('Error loading page data:', err));
   }, [user]);
 
   const loadGallery = () => {
-    fetch('https://functions.poehali.dev/d1439467-0fbd-47d5-9496-bae1cd615868')
+    fetch(GALLERY_URL)
       .then(res => res.json())
       .then(data => setGallery(data))
       .catch(err => console.error('Error loading gallery:', err));
   };
 
+  const handleLike = async (galleryId: number) => {
+    if (!user) {
+      setAuthDialogOpen(true);
+      return;
+    }
+
+    try {
+      const result = await likeArtwork(user.id, galleryId);
+      if (result.changed) {
+        setGallery(prev => prev.map(item => item.id === galleryId ? { ...item, likes: (item.likes || 0) + 1 } : item));
+      }
+    } catch (error) {
+      toast({ title: "Ошибка", description: "Не удалось поставить лайк", variant: "destructive" });
+    }
+  };
+
   const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
     if (e.target.files && e.target.files[0]) {
       setSelectedFile(e.target.files[0]);
@@ -109,35 +120,18 @@ const Index = () => {
     setUploading(true);
 
     try {
-      const reader = new FileReader();
-      reader.readAsDataURL(selectedFile);
-      reader.onload = async () => {
-        const base64 = reader.result?.toString().split(',')[1];
-        
-        const response = await fetch('https://functions.poehali.dev/d1439467-0fbd-47d5-9496-bae1cd615868', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            user_id: user?.id || 1,
-            title: uploadTitle || 'Без названия',
-            description: uploadDescription,
-            image: base64
-          })
-        });
-
-        if (response.ok) {
-          toast({ title: "Успех!", description: "Работа добавлена в галерею" });
-          setUploadDialogOpen(false);
-          setUploadTitle("");
-          setUploadDescription("");
-          setSelectedFile(null);
-          loadGallery();
-        } else {
-          toast({ title: "Ошибка", description: "Не удалось загрузить изображение", variant: "destructive" });
-        }
-      };
+      const userId = user?.id || 1;
+      const key = await uploadImage(selectedFile, userId);
+      await createArtwork(userId, key, uploadTitle || 'Без названия', uploadDescription);
+
+      toast({ title: "Успех!", description: "Работа добавлена в галерею" });
+      setUploadDialogOpen(false);
+      setUploadTitle("");
+      setUploadDescription("");
+      setSelectedFile(null);
+      loadGallery();
     } catch (error) {
-      toast({ title: "Ошибка", description: "Произошла ошибка при загрузке", variant: "destructive" });
+      toast({ title: "Ошибка", description: "Не удалось загрузить изображение", variant: "destructive" });
     } finally {
       setUploading(false);
     }
@@ -362,7 +356,7 @@ const Index = () => {
                       <Input
                         id="file"
                         type="file"
-                        accept="image/*"
+                        accept="image/png,image/jpeg,image/webp"
                         onChange={handleFileSelect}
                       />
                     </div>
@@ -392,7 +386,15 @@ const Index = () => {
                   >
                     {item.image_url ? (
                       <div className="aspect-square overflow-hidden">
-                        <img src={item.image_url} alt={item.title} className="w-full h-full object-cover" />
+                        <img
+                          src={item.image_url}
+                          srcSet={item.srcset || undefined}
+                          sizes="(min-width: 1024px) 25vw, (min-width: 768px) 50vw, 100vw"
+                          alt={item.title}
+                          loading="lazy"
+                          className="w-full h-full object-cover"
+                          style={item.placeholder ? { backgroundImage: `url(${item.placeholder})`, backgroundSize: 'cover' } : undefined}
+                        />
                       </div>
                     ) : (
                       <div className="aspect-square bg-gradient-to-br from-purple-100 via-orange-50 to-blue-100 flex items-center justify-center">
@@ -414,10 +416,14 @@ const Index = () => {
                         </div>
                       </div>
                       <div className="flex items-center justify-between text-sm text-muted-foreground">
-                        <span className="flex items-center gap-1">
+                        <button
+                          type="button"
+                          className="flex items-center gap-1 hover:text-primary transition-colors"
+                          onClick={() => handleLike(item.id)}
+                        >
                           <Icon name="Heart" size={16} />
                           {item.likes || 0}
-                        </span>
+                        </button>
                         <span className="flex items-center gap-1">
                           <Icon name="MessageCircle" size={16} />
                           {item.comments || 0}
@@ -44,7 +44,8 @@ const Lesson = () => {
         body: JSON.stringify({
           user_id: user.id,
           lesson_id: lesson.id,
-          rating: 5
+          rating: 5,
+          timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
         })
       });
 